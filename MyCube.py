@@ -1,170 +1,2219 @@
+import os
+import sys
 import math
+import json
+import operator
+import itertools
+import functools
+import collections
+import time
+import queue
+import struct
 import logging
-from random import sample
+import threading
+import random
 
-logging.basicConfig(level=logging.INFO)
+# asyncio and multiprocessing are imported by the methods which use them, such that importing the module is fast.
+# numpy is optional and slow to import, it is imported by _get_numpy when it is needed the first time.
+# It stays None if it is not installed.
+numpy = None
+_numpy_imported = False
+
+
+def _get_numpy():
+    """
+    The numpy module, None if it is not installed
+    """
+    global numpy, _numpy_imported
+    if not _numpy_imported:
+        _numpy_imported = True
+        try:
+            import numpy
+        except ImportError:
+            pass
+    return numpy
+
+
+def _is_array(points):
+    """
+    Check if the points are a numpy array, numpy is not imported for it
+    """
+    return "numpy" in sys.modules and _get_numpy() is not None and isinstance(points, numpy.ndarray)
 
 
 class MyCube:
-    def __init__(self, length=5):
-        self.logger = logging.getLogger(__name__)
+    logger = logging.getLogger(__name__)
+
+    [ENGINE_LIST, ENGINE_BITBOARD, ENGINE_DLX, ENGINE_DP] = ["list", "bitboard", "dlx", "dp"]
+
+    ENGINES = [ENGINE_LIST, ENGINE_BITBOARD, ENGINE_DLX, ENGINE_DP]
+
+    # Which empty location is filled next: the lowest one, the one with the fewest placements which fit
+    # or the one with the most occupied neighbours
+    [CELL_LOWEST, CELL_FEWEST, CELL_CONSTRAINED] = ["lowest", "fewest", "constrained"]
+
+    CELL_ORDERS = [CELL_LOWEST, CELL_FEWEST, CELL_CONSTRAINED]
+
+    # In which order the placements of a location are tried: the placement table order, a random order
+    # from the seed or first the placements which overlap the fewest other placements
+    [VALUE_TABLE, VALUE_RANDOM, VALUE_LEAST_CONSTRAINING] = ["table", "random", "least_constraining"]
+
+    VALUE_ORDERS = [VALUE_TABLE, VALUE_RANDOM, VALUE_LEAST_CONSTRAINING]
+
+    # Number of place attempts between two checks for progress, idle workers and checkpoint
+    CHECK_INTERVAL = 10000
+
+    # Number of solutions which the parallel workers can send ahead of the parent process passing them on
+    SOLUTIONS_QUEUE_SIZE = 10000
+
+    def __init__(self, length=5, width=None, height=None, voxels=None):
+        """
+        The container to fill is a length x width x height box, a cube if only the length is given,
+        or the voxels (list of [x, y, z] locations) of an arbitrary shape inside their bounding box.
+        A location given several times is one voxel.
+        """
         self.origin = [0, 0, 0]
+        if voxels is not None:
+            voxels = Space.reset_origin([list(voxel) for voxel in voxels])
+            voxels = [list(voxel) for voxel in sorted(set(map(tuple, voxels)))]
+            [_, max_x, _, max_y, _, max_z] = Space.min_max(voxels)
+            [length, width, height] = [max_x + 1, max_y + 1, max_z + 1]
         self.length = length
-        self.size= math.pow(length, 3)
+        self.dimensions = [length, width or length, height or length]
+        self.voxels = voxels
+        # The locations are numbered along the shortest axis first, the longest axis last, such that
+        # the filled part of the container grows through its smallest cross-section
+        self._axes = sorted(range(3), key=lambda axis: self.dimensions[axis])
+        self._strides = [0, 0, 0]
+        stride = 1
+        for axis in self._axes:
+            self._strides[axis] = stride
+            stride *= self.dimensions[axis]
+        self._no_locations = stride
+        self._blocked = 0
+        if voxels is not None:
+            self._blocked = (1 << stride) - 1
+            for voxel in voxels:
+                self._blocked &= ~(1 << self._get_index(voxel))
+        self.size = len(voxels) if voxels is not None else stride
         self.no_gaps = self.size
         self._occupied_locations = []
         self._shape_orientations_rot = []
         self._shape_orientations_points = []
+        self._shape_orientations_masks = []
+        self._placements = []
+        self._symmetries = []
+        self._symmetry_cell = None
+        self._symmetry_orbits = []
+        self._symmetry_images = None
+        self._symmetry_representatives = set()
+        self._placement_orientations = {}
+        self._find_all = False
+        self._prune_every = 0
+        self._dead_cache = 0
+        self._dead_states = None
+        self._cell_order = self.CELL_LOWEST
+        self._value_order = self.VALUE_TABLE
+        self._seed = None
+        self._random = random.Random()
+        self._table = []
+        self._select_cell = None
+        self._cell_neighbours = []
+        self.portfolio_winner = None
+        self.metrics = SearchMetrics()
+        self._shape_size = 0
+        self._min_shape_size = 0
+        self._pieces = []
+        self._orientation_pieces = []
+        self._inventory = None
+        self._inventory_fields = None
+        self._neighbour_masks = []
+        self._on_solution = None
+        self._stack = []
+        self._tasks = None
+        self._checkpoint = None
+        self._resume = []
+        self._stop_search = None
+        self._search_limits = None
         self.no_solutions = 0
         self.solutions = []
         self.no_placed_shapes = 0
         self.place_attempt = 0
-
-    def solve(self, shape):
+        self.dead_cache_hits = 0
+        self.dead_cache_misses = 0
+        self.infeasible_reason = None
+
+    def solve(self, shape, engine=ENGINE_LIST, find_all=False, unique=False, on_solution=None,
+              workers=1, split_depth=3, work_stealing=False,
+              checkpoint=None, checkpoint_interval=5.0, resume_from=None, prune_every=0, precheck=True,
+              dead_cache=0, seed=None, metrics=None, cell_order=CELL_LOWEST, value_order=None, portfolio=None,
+              symmetry_breaking=False):
         """
         Try to combine the shape to form the cube
-        :param shape:
+        :param shape: the shape which is repeated to fill the cube, or the collection of shapes to fill the cube
+        with: a {shape: count} dictionary or a list of shapes or (shape, count) pairs. In the solutions
+        of a collection every placed shape has its index in the collection after the rotations.
+        :param engine: search backend, one of MyCube.ENGINES. The "list" engine keeps the occupied
+        locations as a list of points, the "bitboard" engine keeps them as a single integer bitmask
+        and the "dlx" engine solves it as an exact cover problem with dancing links. The "dp" engine fills the
+        container layer by layer along its longest axis and counts the fillings of every profile of shapes
+        which stick out of the filled layers, its time is linear in the length of a long box (no unique,
+        and no on_solution when finding all).
+        :param find_all: enumerate all the solutions instead of stopping at the first one (not for "list").
+        The returned solution is the first one found.
+        :param unique: only keep one solution for every class of solutions which are the same
+        under the 48 cube symmetries (rotations and mirroring)
+        :param on_solution: called with every solution as soon as it is found
+        :param workers: number of processes to search in parallel (only "bitboard"). The search tree is split
+        after split_depth placed shapes and the disjoint subtrees are distributed to a process pool.
+        :param split_depth: number of placed shapes after which the search tree is split
+        :param work_stealing: instead of a static split, busy workers hand over their unexplored
+        sibling branches to idle workers
+        :param checkpoint: file where the search frontier is saved every checkpoint_interval seconds
+        (only serial "bitboard")
+        :param checkpoint_interval: seconds between two checkpoints
+        :param resume_from: checkpoint file from which the search is continued
+        :param prune_every: every prune_every placed shapes check if the empty locations are split in
+        isolated regions which can not be filled and backtrack immediately (only "bitboard", 0 disables it)
+        :param precheck: before searching, try to prove with colouring arguments that the cube can not be
+        filled. The reason is saved in infeasible_reason.
+        :param dead_cache: maximum number of partial fillings (occupied locations and remaining shapes)
+        proven to have no solution which are kept to skip the same state reached by another order of
+        placements (only "bitboard", 0 disables it). The least recently used states are evicted first, each one
+        takes about 150 bytes. The hits and misses are counted in dead_cache_hits and dead_cache_misses.
+        :param seed: seed of the random order in which the "list" engine tries the shape orientations
+        and of the "random" value order, runs with the same seed are reproducible. A resumed search without seed
+        takes the one of the checkpoint.
+        :param metrics: SearchMetrics to poll while the search is running, a new one without counters is used if
+        not given.
+        It is available in the metrics attribute.
+        :param cell_order: which empty location is filled next, one of CELL_ORDERS (other than "lowest" only
+        "bitboard")
+        :param value_order: in which order the placements of a location are tried, one of VALUE_ORDERS.
+        The default is "random" for the "list" engine (it only supports "random" and "table") and "table"
+        for the "bitboard" engine. The "dlx" engine has its own order.
+        :param portfolio: list of strategies, dictionaries with the cell_order, value_order and seed to use instead
+        of the given ones (no other options). Every strategy searches in its own process (only "bitboard"), the first
+        one which finishes stops the others and its index is saved in portfolio_winner.
+        :param symmetry_breaking: only search the solutions which contain one representative for every class of
+        symmetric placements of the location with the most symmetries (the center of an odd cube), the other
+        solutions are their rotated or mirrored images. They are counted and passed to on_solution without being
+        searched (only serial "bitboard"), which makes the enumerations and the impossible searches up to 48 times
+        faster. The location is saved in symmetry_cell.
         :return:
         """
-        if math.fmod(self.size, shape.no_points):
-            self.logger.info("Can not fit shape with {} number of points in a cube with size {}".format(shape.no_points, self.length))
+        if engine not in self.ENGINES:
+            raise ValueError("Unknown engine '{}', expected one of {}".format(engine, self.ENGINES))
+        if (find_all or unique) and engine == self.ENGINE_LIST:
+            raise ValueError("Engine '{}' can only search for the first solution".format(engine))
+        if engine == self.ENGINE_DP and (unique or (find_all and on_solution)):
+            raise ValueError("Engine '{}' counts the solutions without listing them".format(engine))
+        if workers > 1 and engine != self.ENGINE_BITBOARD:
+            raise ValueError("Engine '{}' can not search in parallel".format(engine))
+        if (checkpoint or resume_from) and (engine != self.ENGINE_BITBOARD or workers > 1):
+            raise ValueError("Checkpoints are only supported by the serial '{}' engine".format(self.ENGINE_BITBOARD))
+        if value_order is None:
+            value_order = self.VALUE_RANDOM if engine == self.ENGINE_LIST else self.VALUE_TABLE
+        for strategy in portfolio or []:
+            unknown_options = sorted(set(strategy) - {"cell_order", "value_order", "seed"})
+            if unknown_options:
+                raise ValueError("Unknown portfolio strategy options {}, expected cell_order, value_order and "
+                                 "seed".format(unknown_options))
+        for strategy in [{"cell_order": cell_order, "value_order": value_order}] + list(portfolio or []):
+            if strategy.get("cell_order", cell_order) not in self.CELL_ORDERS:
+                raise ValueError("Unknown cell order '{}', expected one of {}".format(strategy["cell_order"],
+                                                                                   self.CELL_ORDERS))
+            if strategy.get("value_order", value_order) not in self.VALUE_ORDERS:
+                raise ValueError("Unknown value order '{}', expected one of {}".format(strategy["value_order"],
+                                                                                     self.VALUE_ORDERS))
+        if engine != self.ENGINE_BITBOARD and (cell_order != self.CELL_LOWEST or portfolio or
+                                               value_order not in [self.VALUE_RANDOM, self.VALUE_TABLE]):
+            raise ValueError("Engine '{}' does not support branching strategies".format(engine))
+        if portfolio and (workers > 1 or checkpoint or resume_from):
+            raise ValueError("A portfolio can not be combined with workers or checkpoints")
+        if symmetry_breaking and (engine != self.ENGINE_BITBOARD or workers > 1 or checkpoint or resume_from or
+                                  portfolio):
+            raise ValueError("Symmetry breaking is only supported by the serial '{}' engine".format(
+                self.ENGINE_BITBOARD))
+        pieces = self._get_pieces(shape)
+        if pieces[0][1] is not None and engine == self.ENGINE_LIST:
+            raise ValueError("Engine '{}' can only fill the cube with a single shape".format(engine))
+        if engine == self.ENGINE_LIST and not self.is_cube():
+            raise ValueError("Engine '{}' can only fill a cube".format(engine))
+        if engine == self.ENGINE_DLX and any(count > 1 for _, count in pieces if count is not None):
+            raise ValueError("Engine '{}' can only fill the cube with distinct shapes".format(engine))
+        self.infeasible_reason = None
+        if pieces[0][1] is None and self.size % shape.no_points:
+            self.infeasible_reason = "Can not fit shape with {} number of points in a container with {} locations".format(shape.no_points, self.size)
+        elif pieces[0][1] is not None and sum(piece.no_points * count for piece, count in pieces) != self.size:
+            self.infeasible_reason = "Shapes with {} points in total can not fill a container with {} locations".format(
+                sum(piece.no_points * count for piece, count in pieces), self.size)
+        if self.infeasible_reason:
+            self.logger.info(self.infeasible_reason)
             return [0, []]
         else:
             self.no_solutions = 0
             self.solutions = []
             self.no_placed_shapes = 0
             self.place_attempt = 0
-            self._generate_shape_orientations(shape)
-            self._fill_cube()
+            self.dead_cache_hits = 0
+            self.dead_cache_misses = 0
+            self._on_solution = on_solution
+            if seed is None and value_order == self.VALUE_RANDOM and engine == self.ENGINE_BITBOARD:
+                if resume_from:
+                    # Continue with the placement order of the interrupted search
+                    with open(resume_from) as checkpoint_file:
+                        seed = json.load(checkpoint_file)["options"]["seed"]
+                else:
+                    # The workers must shuffle the placement table in the same order
+                    seed = random.getrandbits(32)
+            self.metrics = metrics or SearchMetrics()
+            self.portfolio_winner = None
+            self._set_search_options({"find_all": find_all, "unique": unique, "prune_every": prune_every,
+                                      "dead_cache": dead_cache, "cell_order": cell_order,
+                                      "value_order": value_order, "seed": seed})
+            self._prepare_search(pieces)
+            if precheck:
+                self.infeasible_reason = self._precheck()
+                if self.infeasible_reason:
+                    self.logger.info(self.infeasible_reason)
+                    return [0, []]
+            self._symmetry_orbits = []
+            self._symmetry_images = None
+            if symmetry_breaking:
+                self._generate_symmetry_breaking()
+            if engine == self.ENGINE_BITBOARD:
+                if portfolio:
+                    self._fill_portfolio(portfolio)
+                elif workers > 1 and work_stealing:
+                    self._fill_work_stealing(workers)
+                elif workers > 1:
+                    self._fill_parallel(workers, split_depth)
+                elif checkpoint or resume_from:
+                    self._fill_checkpointed(checkpoint, checkpoint_interval, resume_from)
+                elif symmetry_breaking:
+                    self._fill_symmetry_breaking()
+                else:
+                    self._fill_bitboard()
+                if dead_cache:
+                    self.logger.info("Dead state cache: {} hits, {} misses, {} states".format(
+                        self.dead_cache_hits, self.dead_cache_misses, len(self._dead_states)))
+            elif engine == self.ENGINE_DLX:
+                self._fill_dlx()
+            elif engine == self.ENGINE_DP:
+                self._fill_dp()
+            else:
+                self._fill_cube()
+            self.metrics.finish(self.place_attempt, self.no_placed_shapes, self.no_solutions)
 
             return self.no_solutions, self.solutions
 
+    def _get_search_options(self):
+        """
+        Options which define the bitboard search tree, used to set up parallel workers and checkpoints
+        """
+        return {"find_all": self._find_all, "unique": bool(self._symmetries), "prune_every": self._prune_every,
+                "dead_cache": self._dead_cache, "cell_order": self._cell_order, "value_order": self._value_order,
+                "seed": self._seed}
+
+    def _set_search_options(self, options):
+        self._find_all = options["find_all"]
+        self._symmetries = self._generate_symmetries() if options["unique"] else []
+        self._prune_every = options["prune_every"]
+        self._dead_cache = options["dead_cache"]
+        self._dead_states = collections.OrderedDict() if self._dead_cache else None
+        self._cell_order = options["cell_order"]
+        self._value_order = options["value_order"]
+        self._seed = options["seed"]
+        self._random.seed(self._seed)
+
+    def iter_solutions(self, shape, engine=ENGINE_BITBOARD, buffer_size=1000, **options):
+        """
+        Generator which yields every solution as soon as it is found. The search runs in a background thread
+        and keeps at most buffer_size solutions which are not consumed yet, closing the generator stops the search.
+        :param shape: the shape or the collection of shapes, see solve
+        :param options: the solve options, except find_all and on_solution
+        """
+        solutions = queue.Queue(maxsize=buffer_size)
+        stop_search = threading.Event()
+
+        def put(item):
+            while not stop_search.is_set():
+                try:
+                    solutions.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+            raise _SearchStopped()
+
+        def search():
+            try:
+                self.solve(shape, engine=engine, find_all=True, on_solution=lambda solution: put(["solution", solution]),
+                           **options)
+                put(["done", None])
+            except _SearchStopped:
+                pass
+            except Exception as error:
+                put(["error", error])
+
+        self._stop_search = stop_search
+        thread = threading.Thread(target=search, daemon=True)
+        thread.start()
+        try:
+            while True:
+                kind, value = solutions.get()
+                if kind == "solution":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            stop_search.set()
+            thread.join()
+            self._stop_search = None
+
+    async def solve_async(self, shape, *, timeout=None, node_budget=None, progress_interval=1.0, **options):
+        """
+        Asynchronous generator which runs the bitboard search in a worker process and yields the events
+        ("progress", metrics snapshot) every progress_interval seconds, ("solution", solution) for every solution
+        found and at the end ("done", metrics snapshot with the status and the infeasible_reason).
+        The status is "finished", "timeout" when the search ran longer than timeout seconds or "node_budget" when it
+        made more than node_budget place attempts, the snapshot has the statistics of the partial search such as
+        place_attempt and the deepest number of placed shapes. The budgets are checked every CHECK_INTERVAL place
+        attempts. Cancelling the task which iterates or closing the generator with aclose() kills the worker.
+        The counters, the number of solutions and the first solution are also saved in the cube.
+        :param shape: the shape or the collection of shapes, see solve
+        :param options: the solve options of the serial "bitboard" engine, except on_solution and metrics
+        """
+        if options.get("engine", self.ENGINE_BITBOARD) != self.ENGINE_BITBOARD or options.get("workers", 1) > 1:
+            raise ValueError("Only the serial '{}' engine can be solved asynchronously".format(self.ENGINE_BITBOARD))
+        options["engine"] = self.ENGINE_BITBOARD
+        pieces = [[piece.points, count] for piece, count in self._get_pieces(shape)]
+        import asyncio
+        import multiprocessing
+        events = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_async_worker,
+                                          args=(self._get_container(), pieces, options, timeout, node_budget,
+                                                progress_interval, events),
+                                          daemon=True)
+        loop = asyncio.get_running_loop()
+        self.no_solutions = 0
+        self.solutions = []
+        process.start()
+        try:
+            while True:
+                # Short waits such that a cancelled task does not keep an executor thread for long
+                received = await loop.run_in_executor(None, _get_events, events, 0.1)
+                if not received and not process.is_alive() and events.empty():
+                    raise RuntimeError("Search process exited with code {}".format(process.exitcode))
+                for kind, value in received:
+                    if kind == "error":
+                        raise value
+                    if kind == "solution":
+                        if not self.no_solutions:
+                            self.solutions = value
+                        self.no_solutions += 1
+                    else:
+                        self.place_attempt = value["place_attempt"]
+                        self.no_placed_shapes = value["no_placed_shapes"]
+                    if kind == "done":
+                        self.infeasible_reason = value["infeasible_reason"]
+                    yield kind, value
+                    if kind == "done":
+                        return
+        finally:
+            process.terminate()
+            process.join()
+
+    @classmethod
+    def from_file(cls, file_name):
+        """
+        Load a voxel container from a text file: every layer (z) is a block of rows (y) separated by an empty line,
+        every character of a row (x) is a voxel except '.' and ' ' which are outside of the container.
+        """
+        voxels = []
+        with open(file_name) as container_file:
+            layers = container_file.read().strip("\n").split("\n\n")
+        for z, layer in enumerate(layers):
+            for y, row in enumerate(layer.split("\n")):
+                voxels.extend([x, y, z] for x, voxel in enumerate(row.rstrip()) if voxel not in ". ")
+        if not voxels:
+            raise ValueError("Container file {} has no voxels".format(file_name))
+        return cls(voxels=voxels)
+
+    def is_cube(self):
+        """
+        Check if the container is a full cube
+        """
+        return self.voxels is None and self.dimensions.count(self.length) == 3
+
+    def _get_container(self):
+        """
+        Arguments to create the same container in the worker processes and to compare checkpoints
+        """
+        return [self.dimensions[0], self.dimensions[1], self.dimensions[2], self.voxels]
+
+    @staticmethod
+    def _get_pieces(shape):
+        """
+        Normalize the shapes to solve to a list of [shape, count].
+        The count is None when the cube is filled with copies of a single shape.
+        """
+        if isinstance(shape, Shape):
+            return [[shape, None]]
+        items = shape.items() if isinstance(shape, dict) else \
+            [item if isinstance(item, (list, tuple)) else (item, 1) for item in shape]
+        pieces = []
+        for piece, count in items:
+            for same_piece in pieces:
+                if same_piece[0] == piece:
+                    same_piece[1] += count
+                    break
+            else:
+                pieces.append([piece, count])
+        if not pieces:
+            raise ValueError("No shapes to fill the cube with")
+        return pieces
+
+    def _prepare_search(self, pieces):
+        """
+        Generate the orientations of the shapes, the shared placement table and the masks used by the search.
+        For a collection of shapes the remaining count of every shape is packed in an integer (the inventory),
+        such that placing a shape is a subtraction and the availability check an AND.
+        :param pieces: list of [shape, count] from _get_pieces
+        """
+        self._pieces = pieces
+        if pieces[0][1] is None:
+            shape = pieces[0][0]
+            self._shape_size = self._min_shape_size = shape.no_points
+            self._orientation_pieces = []
+            self._inventory = None
+            self._inventory_fields = None
+            self._generate_shape_orientations(shape)
+            # The placement table is cached in the shape for every container, cubes by their length
+            container = self.length if self.is_cube() else (tuple(self.dimensions), self._blocked)
+            self._placements = shape.get_placements(container)
+            if self._placements is None:
+                self._generate_shape_orientations_masks()
+                self._generate_placements()
+                shape.set_placements(container, self._placements)
+        else:
+            sizes = [piece.no_points for piece, _ in pieces]
+            self._shape_size = functools.reduce(math.gcd, sizes)
+            self._min_shape_size = min(sizes)
+            self._shape_orientations_points = []
+            self._shape_orientations_rot = []
+            self._orientation_pieces = []
+            for piece_index, (piece, _) in enumerate(pieces):
+                for points, rotation in piece.orientations:
+                    self._shape_orientations_points.append([list(point) for point in points])
+                    self._shape_orientations_rot.append(list(rotation))
+                    self._orientation_pieces.append(piece_index)
+            field_bits = max(count for _, count in pieces).bit_length() + 1
+            self._inventory = sum(count << (piece_index * field_bits) for piece_index, (_, count) in enumerate(pieces))
+            self._inventory_fields = [(((1 << field_bits) - 1) << (piece_index * field_bits), 1 << (piece_index * field_bits))
+                                      for piece_index in self._orientation_pieces]
+            self._generate_shape_orientations_masks()
+            self._generate_placements()
+        if self._symmetries:
+            self._symmetries = self._get_placement_symmetries(self._symmetries)
+        self._generate_neighbour_masks()
+        self._generate_search_table()
+        self.metrics.reset([self._get_location(index) for index in range(self._no_locations)],
+                           self._no_locations // self._min_shape_size, max(map(len, self._table)))
+
+    def _generate_search_table(self):
+        """
+        Table of the placements tried by the bitboard search for every location, in the value order.
+        Filling the lowest location only needs the placements which have it as their lowest point,
+        the other cell orders can fill any location and need all the placements which cover it.
+        """
+        table = self._placements
+        if self._cell_order != self.CELL_LOWEST or self._value_order == self.VALUE_LEAST_CONSTRAINING:
+            covers = [[] for _ in range(self._no_locations)]
+            for placements in self._placements:
+                for placement in placements:
+                    for index in self._get_mask_indexes(placement[0]):
+                        covers[index].append(placement)
+            if self._cell_order != self.CELL_LOWEST:
+                table = covers
+            if self._value_order == self.VALUE_LEAST_CONSTRAINING:
+                # Number of placements which overlap a placement, counted once per covered location
+                table = [sorted(placements, key=lambda placement: sum(len(covers[index]) for index in
+                                                                      self._get_mask_indexes(placement[0])))
+                         for placements in table]
+        if self._value_order == self.VALUE_RANDOM:
+            table_random = random.Random(self._seed)
+            table = [table_random.sample(placements, len(placements)) for placements in table]
+        self._table = table
+
+        self._select_cell = None
+        if self._cell_order == self.CELL_FEWEST:
+            self._select_cell = self._select_fewest
+        elif self._cell_order == self.CELL_CONSTRAINED:
+            self._select_cell = self._select_constrained
+            self._cell_neighbours = []
+            for index in range(self._no_locations):
+                location = self._get_location(index)
+                neighbours = 0
+                for axis in range(3):
+                    for step in [-1, 1]:
+                        neighbour = list(location)
+                        neighbour[axis] += step
+                        # The walls of the container count as occupied neighbours
+                        if 0 <= neighbour[axis] < self.dimensions[axis]:
+                            neighbours |= 1 << self._get_index(neighbour)
+                self._cell_neighbours.append([neighbours, 6 - bin(neighbours).count("1")])
+
+    def _select_fewest(self, occupied, inventory):
+        """
+        Empty location with the fewest placements which fit, a location without any is returned immediately
+        """
+        fields = self._inventory_fields
+        free = ((1 << self._no_locations) - 1) ^ occupied
+        best_gape = None
+        best_count = None
+        while free:
+            location_bit = free & -free
+            free ^= location_bit
+            current_gape = location_bit.bit_length() - 1
+            count = 0
+            for shape_mask, index in self._table[current_gape]:
+                if not occupied & shape_mask and (fields is None or inventory & fields[index][0]):
+                    count += 1
+                    if best_count is not None and count >= best_count:
+                        break
+            if best_count is None or count < best_count:
+                best_gape, best_count = current_gape, count
+                if count <= 1:
+                    break
+        return best_gape
+
+    def _select_constrained(self, occupied, inventory):
+        """
+        Empty location with the most occupied neighbours, the lowest one if there are several
+        """
+        free = ((1 << self._no_locations) - 1) ^ occupied
+        best_gape = None
+        best_count = -1
+        while free:
+            location_bit = free & -free
+            free ^= location_bit
+            current_gape = location_bit.bit_length() - 1
+            neighbours, walls = self._cell_neighbours[current_gape]
+            count = bin(neighbours & occupied).count("1") + walls
+            if count > best_count:
+                best_gape, best_count = current_gape, count
+        return best_gape
+
+    def _get_piece_counts(self):
+        """
+        Number of shapes placed in a filled cube for every piece
+        """
+        if self._inventory is None:
+            return [self.size // self._shape_size]
+        return [count for _, count in self._pieces]
+
+    def _get_inventory(self, placed_shapes):
+        """
+        Inventory left after placing the shapes
+        """
+        inventory = self._inventory
+        for _, index in placed_shapes:
+            inventory -= self._inventory_fields[index][1]
+        return inventory
+
     def _generate_shape_orientations(self, shape):
         """
         Generate the 24 possible shape orientations
         :return:
         """
-        for rot_x in Space.ROTATIONS:
-            for rot_y in Space.ROTATIONS:
-                for rot_z in Space.ROTATIONS:
-                    shape_points = Space.rotate_points_x_axis(shape.points, rot_x, reset_origin=True)
-                    shape_points = Space.rotate_points_y_axis(shape_points, rot_y, reset_origin=True)
-                    shape_points = Space.rotate_points_z_axis(shape_points, rot_z, reset_origin=True)
-                    orientation_considered = False
-                    for existing_orientation in self._shape_orientations_points:
-                        if all(point in existing_orientation for point in shape_points):
-                            orientation_considered = True
-                    if not orientation_considered:
-                        self._shape_orientations_points.append(shape_points)
-                        self._shape_orientations_rot.append([rot_x, rot_y, rot_z])
+        orientations = shape.orientations
+        self._shape_orientations_points = [[list(point) for point in points] for points, _ in orientations]
+        self._shape_orientations_rot = [list(rotation) for _, rotation in orientations]
 
-    def _fill_cube(self, current_gape=[0, 0, 0], occupied_locations=[], shapes_locations=[]):
+    def _generate_shape_orientations_masks(self):
         """
+        Generate for every shape orientation the bitmask of its points placed at the origin.
+        Bit index of a point is given by _get_index, for a cube the same order used by _get_next_location.
+        Every orientation is anchored on its lowest point (the first one in bit order), such that the
+        shape can be placed with the anchor on the next gap.
+        :return:
         """
-        solution_found = False
+        self._shape_orientations_masks = []
+        for shape_points in self._shape_orientations_points:
+            mask = 0
+            for point in shape_points:
+                mask |= 1 << self._get_index(point)
+            anchor = min(shape_points, key=self._get_index)
+            [_, max_x, _, max_y, _, max_z] = Space.min_max(shape_points)
+            self._shape_orientations_masks.append([mask, anchor, [max_x, max_y, max_z]])
+
+    def _get_index(self, location):
+        """
+        Bit index of a location in the cube bitmask
+        """
+        strides = self._strides
+        return location[0] * strides[0] + location[1] * strides[1] + location[2] * strides[2]
 
-        no_orientations = len(self._shape_orientations_points)
-        for index in sample(range(no_orientations), no_orientations):
-            shape_points = self._shape_orientations_points[index]
+    def _generate_placements(self):
+        """
+        Build the placement table: for every location in the cube the list of [shape mask, orientation index]
+        of all placements inside the cube which have that location as their lowest point.
+        The table only depends on the container and the shape orientations so it is built once per shape.
+        :return:
+        """
+        [length_x, length_y, length_z] = self.dimensions
+        blocked = self._blocked
+        self._placements = [[] for _ in range(self._no_locations)]
+        for index, (mask, anchor, max_point) in enumerate(self._shape_orientations_masks):
+            for origin_z in range(length_z - max_point[2]):
+                for origin_y in range(length_y - max_point[1]):
+                    for origin_x in range(length_x - max_point[0]):
+                        origin = self._get_index([origin_x, origin_y, origin_z])
+                        if not (mask << origin) & blocked:
+                            self._placements[origin + self._get_index(anchor)].append((mask << origin, index))
+
+    def _generate_neighbour_masks(self):
+        """
+        Generate the masks used to flood fill the cube bitmask: for each of the 6 neighbour directions
+        the bit shift and the mask of the locations which can be reached by it without wrapping around.
+        """
+        locations = [self._get_location(index) for index in range(self._no_locations)]
+        self._neighbour_masks = []
+        for axis, shift in enumerate(self._strides):
+            # Shifting up can not land on the first layer, shifting down can not land on the last layer
+            self._neighbour_masks.append((shift, sum(1 << index for index, location in enumerate(locations)
+                                                     if location[axis] != 0)))
+            self._neighbour_masks.append((-shift, sum(1 << index for index, location in enumerate(locations)
+                                                      if location[axis] != self.dimensions[axis] - 1)))
+
+    def _has_dead_region(self, occupied):
+        """
+        Flood fill the empty locations and check if any isolated region can not be filled with shapes,
+        i.e. its number of locations is not a multiple of the shape number of points or smaller than the smallest shape.
+        """
+        free = ((1 << self._no_locations) - 1) ^ occupied
+        while free:
+            region = free & -free
+            while True:
+                grown = region
+                for shift, mask in self._neighbour_masks:
+                    grown |= ((region << shift) if shift > 0 else (region >> -shift)) & mask
+                grown &= free
+                if grown == region:
+                    break
+                region = grown
+            region_size = bin(region).count("1")
+            if region_size % self._shape_size or region_size < self._min_shape_size:
+                return True
+            free ^= region
+        return False
+
+    def _generate_colourings(self):
+        """
+        Generate the colourings used to prove that the cube can not be filled: the checkerboard colouring
+        and for every modulo m the colouring of the layers, resp. diagonal planes, with coordinate 0 modulo m.
+        :return: list of [name, bitmask with the coloured locations]
+        """
+        locations = [self._get_location(index) for index in range(self._no_locations)]
+        colourings = [["checkerboard", [sum(location) % 2 == 0 for location in locations]]]
+        for modulo in range(2, max(self.dimensions) + 1):
+            for axis, name in enumerate("xyz"):
+                colourings.append(["{} mod {}".format(name, modulo),
+                                   [location[axis] % modulo == 0 for location in locations]])
+            if modulo > 2:
+                colourings.append(["x+y+z mod {}".format(modulo),
+                                   [sum(location) % modulo == 0 for location in locations]])
+        return [[name, sum(1 << index for index, coloured in enumerate(colours) if coloured) & ~self._blocked]
+                for name, colours in colourings]
+
+    def _precheck(self):
+        """
+        Try to prove that the cube can not be filled before searching.
+        Every location must be covered by at least one placement. For every colouring, each placement covers a
+        number of coloured locations from a known set of values, the shapes together must cover exactly the
+        coloured locations of the cube.
+        :return: the reason why the cube can not be filled or None if no proof was found
+        """
+        piece_counts = self._get_piece_counts()
+        pieces_masks = [[] for _ in piece_counts]
+        for placements in self._placements:
+            for shape_mask, index in placements:
+                pieces_masks[self._orientation_pieces[index] if self._orientation_pieces else 0].append(shape_mask)
+        uncovered = ((1 << self._no_locations) - 1) ^ self._blocked ^ \
+            functools.reduce(operator.or_, itertools.chain(*pieces_masks), 0)
+        if uncovered:
+            location = self._get_location((uncovered & -uncovered).bit_length() - 1)
+            return "Location {} can not be covered by any shape".format(location)
+
+        for name, colour_mask in self._generate_colourings():
+            # Bit i of reachable is set if i coloured locations can be covered
+            reachable = 1
+            all_values = []
+            for masks, count in zip(pieces_masks, piece_counts):
+                values = set(bin(shape_mask & colour_mask).count("1") for shape_mask in masks)
+                all_values.append(sorted(values))
+                for _ in range(count):
+                    reachable = functools.reduce(operator.or_, (reachable << value for value in values), 0)
+            no_coloured = bin(colour_mask).count("1")
+            if not (reachable >> no_coloured) & 1:
+                return "Colouring '{}': {} shapes covering {} coloured locations each can not cover the " \
+                       "{} coloured locations of the cube".format(name, piece_counts if len(piece_counts) > 1
+                                                                  else piece_counts[0],
+                                                                  all_values if len(all_values) > 1
+                                                                  else all_values[0], no_coloured)
+        return None
+
+    def _get_location(self, index):
+        """
+        Location [x, y, z] of a bit index in the cube bitmask
+        """
+        location = [0, 0, 0]
+        for axis in self._axes:
+            index, location[axis] = divmod(index, self.dimensions[axis])
+        return location
+
+    def _get_shapes_locations(self, placed_shapes):
+        """
+        Convert the placed shapes stack [(shape mask, orientation index), ...] to the solution format
+        [location, rot_x, rot_y, rot_z] or [location, rot_x, rot_y, rot_z, shape index] for a collection of shapes.
+        The location is the lowest point of the placed shape.
+        """
+        shapes_locations = []
+        for shape_mask, index in sorted(placed_shapes):
+            rot_x, rot_y, rot_z = self._shape_orientations_rot[index]
+            location = (shape_mask & -shape_mask).bit_length() - 1
+            shapes_locations.append([self._get_location(location), rot_x, rot_y, rot_z])
+            if self._orientation_pieces:
+                shapes_locations[-1].append(self._orientation_pieces[index])
+        return shapes_locations
+
+    def _generate_symmetries(self):
+        """
+        Generate the 48 symmetries of the cube (24 rotations, each one with and without mirroring)
+        as permutations of the location bit indexes. For other containers only the rotations and mirrorings
+        which map the container onto itself are kept.
+        :return: list of permutations, permutation[index] is the new index of the location
+        """
+        locations = [self._get_location(index) for index in range(self._no_locations)]
+        mirrored = [[self.dimensions[0] - 1 - x, y, z] for [x, y, z] in locations]
+        symmetries = []
+        symmetries_seen = set()
+        for points in Space.rotate_points_all(locations, Space.cube_rotations(), reset_origin=True) + \
+                Space.rotate_points_all(mirrored, Space.cube_rotations(), reset_origin=True):
+            if any(point[axis] >= self.dimensions[axis] for point in points[:1] + points[-1:] for axis in range(3)):
+                continue
+            permutation = [self._get_index(point) for point in points]
+            if any((self._blocked >> index) & 1 != (self._blocked >> permutation[index]) & 1
+                   for index in range(self._no_locations)):
+                continue
+            if tuple(permutation) not in symmetries_seen:
+                symmetries_seen.add(tuple(permutation))
+                symmetries.append(permutation)
+        return symmetries
+
+    def _is_canonical(self, placed_shapes):
+        """
+        Check if a solution is the representative of its class under the cube symmetries,
+        i.e. its sorted (shape mask, shape index) are the smallest among all its symmetric images.
+        Only the solution itself is needed, no previous solutions have to be stored.
+        """
+        pieces = self._orientation_pieces
+        solution = sorted((shape_mask, pieces[index] if pieces else 0) for shape_mask, index in placed_shapes)
+        for permutation in self._symmetries:
+            image = []
+            for shape_mask, piece in solution:
+                image_mask = 0
+                for index in self._get_mask_indexes(shape_mask):
+                    image_mask |= 1 << permutation[index]
+                image.append((image_mask, piece))
+            if self._symmetry_orbits and not any(image_mask >> self._symmetry_cell & 1 and
+                                                 (image_mask, piece) in self._symmetry_representatives
+                                                 for image_mask, piece in image):
+                # Only the images which contain a representative placement are searched
+                continue
+            if sorted(image) < solution:
+                return False
+        return True
+
+    @staticmethod
+    def _map_mask(mask, permutation):
+        """
+        Image of a location bitmask under a symmetry
+        """
+        image_mask = 0
+        for index in MyCube._get_mask_indexes(mask):
+            image_mask |= 1 << permutation[index]
+        return image_mask
 
+    def _get_placement_symmetries(self, symmetries):
+        """
+        Symmetries which map every placement onto a placement of the same shape,
+        the mirrorings map a chiral shape onto another shape
+        """
+        pieces = self._orientation_pieces
+        keys = set((mask, pieces[index] if pieces else 0) for placements in self._placements
+                   for mask, index in placements)
+        return [permutation for permutation in symmetries
+                if all((self._map_mask(mask, permutation), piece) in keys for mask, piece in keys)]
+
+    def _generate_symmetry_breaking(self):
+        """
+        Choose the symmetry breaking location and the representatives of its placements. The stabilizer of the
+        location (the symmetries from _get_placement_symmetries which do not move it) permutes the placements which
+        cover it. Every solution is the image of a solution which contains a representative under a symmetry of the
+        stabilizer, so the representatives are the smallest placement of every orbit and the solutions which contain
+        one stand for the images of the representative, one per placement of its orbit:
+        |stabilizer| / |stabilizer of the placement| solutions.
+        """
+        pieces = self._orientation_pieces
+        self._placement_orientations = {}
+        for placements in self._placements:
+            for mask, index in placements:
+                self._placement_orientations[(mask, pieces[index] if pieces else 0)] = index
+        group = self._symmetries or self._get_placement_symmetries(self._generate_symmetries())
+        locations = [index for index in range(self._no_locations) if not (self._blocked >> index) & 1]
+        self._symmetry_cell = max(locations, key=lambda index: (sum(permutation[index] == index
+                                                                    for permutation in group), -index))
+        stabilizer = [permutation for permutation in group if permutation[self._symmetry_cell] == self._symmetry_cell]
+        identity = list(range(self._no_locations))
+        self._symmetry_orbits = []
+        self._symmetry_representatives = set()
+        for key in sorted(self._placement_orientations):
+            if not key[0] >> self._symmetry_cell & 1 or any(key in images for _, images in self._symmetry_orbits):
+                continue
+            # One symmetry which maps the representative onto every placement of the orbit
+            images = collections.OrderedDict([(key, identity)])
+            for permutation in stabilizer:
+                images.setdefault((self._map_mask(key[0], permutation), key[1]), permutation)
+            self._symmetry_orbits.append([(key[0], self._placement_orientations[key]), images])
+            self._symmetry_representatives.add(key)
+        self.logger.info("Symmetry breaking at location {}: {} symmetries, {} representative placements".format(
+            self._get_location(self._symmetry_cell), len(stabilizer), len(self._symmetry_orbits)))
+
+    def _fill_symmetry_breaking(self):
+        """
+        Bitboard search of the solutions which contain a representative placement of the symmetry breaking location
+        :return: True if the search shall stop
+        """
+        full = (1 << self._no_locations) - 1
+        for placement, images in self._symmetry_orbits:
+            self._symmetry_images = list(images.values())
+            occupied = self._blocked | placement[0]
+            if occupied == full:
+                stop = self._add_solution([placement])
+            else:
+                current_gape = (~occupied & (occupied + 1)).bit_length() - 1
+                if self._select_cell is not None:
+                    inventory = self._get_inventory([placement]) if self._inventory_fields else self._inventory
+                    current_gape = self._select_cell(occupied, inventory)
+                stop = self._fill_bitboard(current_gape, occupied, [placement])
+            if stop:
+                return True
+        return False
+
+    def _get_image(self, placed_shapes, permutation):
+        """
+        Placed shapes (shape mask, orientation index) of the image of a solution under a symmetry
+        """
+        pieces = self._orientation_pieces
+        image = []
+        for shape_mask, index in placed_shapes:
+            image_mask = self._map_mask(shape_mask, permutation)
+            image.append((image_mask, self._placement_orientations[(image_mask, pieces[index] if pieces else 0)]))
+        return image
+
+    def _add_solution(self, placed_shapes):
+        """
+        Record a filled cube. Only the first solution is kept, the others are passed to the on_solution callback.
+        :param placed_shapes: stack with the placed shapes as (shape mask, orientation index)
+        :return: True if the search shall stop
+        """
+        if self._symmetries and not self._is_canonical(placed_shapes):
+            return False
+        # With symmetry breaking the solution stands for its images, the first one is the solution itself
+        images = self._symmetry_images if self._symmetry_images and self._find_all and not self._symmetries else [None]
+        if not self.no_solutions:
+            self.solutions = self._get_shapes_locations(placed_shapes)
+        self.no_solutions += len(images)
+        if self._on_solution:
+            for permutation in images:
+                self._on_solution(self._get_shapes_locations(placed_shapes if permutation is None else
+                                                             self._get_image(placed_shapes, permutation)))
+        return not self._find_all
+
+    def _fill_bitboard(self, current_gape=None, occupied=None, placed_shapes=None, first_index=0,
+                       split_depth=0, subproblems=None):
+        """
+        Same search as _fill_cube but the occupied locations are kept as an integer bitmask:
+        fit test is an AND, placing/removing a shape is an XOR and the next gap is the lowest clear bit.
+        Only the placements from the precomputed table which cover the gap are tried.
+        The search runs on an explicit stack with preallocated per-depth lists instead of recursion, such that
+        there is no depth limit and the open nodes can be saved in a checkpoint or handed over to an idle worker.
+        With the dead state cache, a node whose placements were all tried without filling the cube is cached
+        by its occupied locations and inventory. The node can only be cached if its whole subtree was searched
+        here, i.e. it was not resumed, split or partly handed over to another worker (fills is -1).
+        :param current_gape: bit index of the next location to be filled
+        :param occupied: bitmask with the occupied locations
+        :param placed_shapes: the already placed shapes as (shape mask, orientation index)
+        :param first_index: index of the first placement to try on the start node
+        :param split_depth: when set, the nodes with split_depth placed shapes are not searched
+        but added as subproblems (gap, occupied, placed shapes) to the subproblems list
+        :return: True if the search shall stop
+        """
+        if occupied is None:
+            # Start with the locations outside of the container occupied
+            occupied = self._blocked
+            current_gape = (~occupied & (occupied + 1)).bit_length() - 1
+            if self._select_cell is not None:
+                current_gape = self._select_cell(occupied, self._inventory)
+        placed_shapes = list(placed_shapes or [])
+        base = len(placed_shapes)
+        full = (1 << self._no_locations) - 1
+        max_depth = bin(full ^ occupied).count("1") + 1
+        placed_shapes.extend([None] * max_depth)
+        gapes = [0] * max_depth
+        occupieds = [0] * max_depth
+        indexes = [0] * max_depth
+        ends = [0] * max_depth
+        inventories = [0] * max_depth
+        fills = [0] * max_depth
+        self._stack = [base, gapes, occupieds, indexes, ends, fills]
+        table = self._table
+        select_cell = self._select_cell
+        check_interval = self.CHECK_INTERVAL
+        prune_every = self._prune_every
+        inventory_fields = self._inventory_fields
+        inventory = 0
+        dead_states = self._dead_states if not split_depth else None
+        dead_cache = self._dead_cache
+        no_locations = self._no_locations
+        # Number of times the cube was filled, a node is dead if it did not change while searching the node
+        no_fills = 0
+        metrics = self.metrics
+        counters = metrics.counters
+        nodes_per_depth = metrics.nodes_per_depth
+        nodes_per_location = metrics.nodes_per_location
+        branching = metrics.branching
+        # Number of placements which fit on the node of every depth
+        children = [0] * max_depth
+        timing = metrics.timing
+        timings = metrics.timings
+        perf_counter = time.perf_counter
+
+        depth = 0
+        gapes[0] = current_gape
+        occupieds[0] = occupied
+        if inventory_fields is not None:
+            inventories[0] = self._get_inventory(placed_shapes[:base])
+        fills[0] = -1 if self._resume or first_index else 0
+        indexes[0] = self._resume_index(current_gape) if self._resume else first_index
+        ends[0] = len(table[current_gape])
+        while depth >= 0:
+            index = indexes[depth]
+            if index >= ends[depth]:
+                if dead_states is not None and fills[depth] == no_fills:
+                    dead_states[occupieds[depth] | inventories[depth] << no_locations] = None
+                    if len(dead_states) > dead_cache:
+                        dead_states.popitem(last=False)
+                if counters:
+                    branching[children[depth]] += 1
+                # All placements tried, go back to the previous shape
+                depth -= 1
+                continue
+            indexes[depth] = index + 1
             self.place_attempt += 1
-            if self.place_attempt % 100000 == 0:
-                self.logger.info("Attempt [{}]: No of placed shapes {}".format(self.place_attempt, self.no_placed_shapes))
+            if self.place_attempt % check_interval == 0:
+                self._check_search(depth, placed_shapes)
+
+            placement = table[gapes[depth]][index]
+            occupied = occupieds[depth]
+            if timing:
+                tick = perf_counter()
+                fits = not occupied & placement[0]
+                timings[0] += perf_counter() - tick
+                if not fits:
+                    continue
+            elif occupied & placement[0]:
+                continue
+            if inventory_fields is not None:
+                # Check that a copy of the shape is left
+                piece_field, piece_unit = inventory_fields[placement[1]]
+                inventory = inventories[depth]
+                if not inventory & piece_field:
+                    continue
+                inventory -= piece_unit
+            if counters:
+                children[depth] += 1
+            placed_shapes[base + depth] = placement
+            occupied ^= placement[0]
+            if occupied == full:
+                no_fills += 1
+                if self._add_solution(placed_shapes[:base + depth + 1]):
+                    self.no_placed_shapes = base + depth + 1
+                    return True
+                continue
+
+            if prune_every and (base + depth + 1) % prune_every == 0 and self._has_dead_region(occupied):
+                continue
+
+            if dead_states is not None:
+                state = occupied | inventory << no_locations
+                if state in dead_states:
+                    dead_states.move_to_end(state)
+                    self.dead_cache_hits += 1
+                    continue
+                self.dead_cache_misses += 1
+
+            if timing:
+                tick = perf_counter()
+                current_gape = select_cell(occupied, inventory) if select_cell is not None else \
+                    (~occupied & (occupied + 1)).bit_length() - 1
+                timings[1] += perf_counter() - tick
+            elif select_cell is not None:
+                current_gape = select_cell(occupied, inventory)
+            else:
+                # The next gap is the lowest clear bit
+                current_gape = (~occupied & (occupied + 1)).bit_length() - 1
+            depth += 1
+            if counters:
+                nodes_per_depth[base + depth] += 1
+                nodes_per_location[current_gape] += 1
+            if depth == split_depth:
+                subproblems.append((current_gape, occupied, placed_shapes[:base + depth]))
+                depth -= 1
+                continue
+            gapes[depth] = current_gape
+            occupieds[depth] = occupied
+            inventories[depth] = inventory
+            children[depth] = 0
+            fills[depth] = -1 if self._resume else no_fills
+            indexes[depth] = self._resume_index(current_gape) if self._resume else 0
+            ends[depth] = len(table[current_gape])
+
+        return False
+
+    def _check_search(self, depth, placed_shapes):
+        """
+        Periodic check of the running bitboard search: log the progress, hand over work to idle workers
+        and save the checkpoint
+        :param depth: depth of the current node in the search stack
+        """
+        self.no_placed_shapes = self._stack[0] + depth
+        if self._stop_search is not None and self._stop_search.is_set():
+            raise _SearchStopped()
+        if self._search_limits is not None:
+            deadline, node_budget = self._search_limits
+            if deadline is not None and time.monotonic() >= deadline:
+                raise _SearchStopped("timeout")
+            if node_budget is not None and self.place_attempt >= node_budget:
+                raise _SearchStopped("node_budget")
+        self.metrics.update(self.place_attempt, self.no_placed_shapes)
+        if self.place_attempt % 100000 == 0:
+            self.logger.info("Attempt [{}]: No of placed shapes {}".format(self.place_attempt, self.no_placed_shapes))
+        if self._tasks is not None:
+            self._share_work(depth, placed_shapes)
+        if self._checkpoint and time.monotonic() >= self._checkpoint[2]:
+            self._write_checkpoint(depth)
+
+    def _resume_index(self, current_gape):
+        """
+        Index of the placement to continue with when a node from the checkpoint frontier is entered again
+        """
+        resume_gape, index = self._resume.pop(0)
+        if resume_gape != current_gape:
+            raise ValueError("Checkpoint frontier does not match the search at location {}".format(current_gape))
+        return index
 
-            for shift_x in range(self.length):
+    def _get_worker_pieces(self):
+        """
+        Shapes to solve in the format passed to the worker processes and saved in checkpoints
+        """
+        return [[piece.points, count] for piece, count in self._pieces]
+
+    def _share_pieces(self):
+        """
+        Keep the shapes in _parent_shapes while the worker processes are started, such that the forked workers
+        find their placement tables. Cleared when the workers are stopped.
+        """
+        _parent_shapes.clear()
+        _parent_shapes.update((piece.key, piece) for piece, _ in self._pieces)
+
+    def _fill_parallel(self, workers, split_depth):
+        """
+        Split the bitboard search tree in disjoint subtrees and search them with a pool of processes.
+        In first solution mode all the workers are stopped as soon as one of them finds a solution.
+        :return: True if the search was stopped
+        """
+        subproblems = []
+        if self._fill_bitboard(split_depth=split_depth, subproblems=subproblems):
+            return True
+        self.logger.info("Search tree split in {} subproblems for {} workers".format(len(subproblems), workers))
+
+        import multiprocessing
+        # The workers put every solution on the queue as soon as they find it
+        solutions_queue = multiprocessing.Queue(self.SOLUTIONS_QUEUE_SIZE) if self._stream_solutions() else None
+        self._share_pieces()
+        pool = multiprocessing.Pool(workers, initializer=_init_worker,
+                                    initargs=(self._get_container(), self._get_worker_pieces(),
+                                              self._get_worker_options(), solutions_queue))
+        no_forwarded = 0
+        try:
+            results = pool.imap_unordered(_solve_subproblem, subproblems)
+            while True:
+                if solutions_queue is not None:
+                    no_forwarded += self._forward_solutions(solutions_queue, 0.01)
+                try:
+                    no_solutions, solutions, place_attempt, counters = \
+                        results.next(timeout=0 if solutions_queue is not None else None)
+                except multiprocessing.TimeoutError:
+                    continue
+                except StopIteration:
+                    break
+                self.place_attempt += place_attempt
+                self.metrics.merge(counters)
+                self.metrics.update(self.place_attempt, self.no_placed_shapes)
+                if no_solutions and not self.no_solutions:
+                    self.solutions = solutions
+                self.no_solutions += no_solutions
+                if no_solutions and not self._find_all:
+                    if self._on_solution:
+                        self._on_solution(self.solutions)
+                    return True
+            # The last solutions may still be on their way
+            while solutions_queue is not None and no_forwarded < self.no_solutions:
+                no_forwarded += self._forward_solutions(solutions_queue, None)
+        finally:
+            pool.terminate()
+            pool.join()
+            _parent_shapes.clear()
+
+        return False
+
+    def _get_worker_options(self):
+        """
+        Search options passed to the worker processes, with the counters option of the metrics
+        """
+        return dict(self._get_search_options(), counters=self.metrics.counters)
+
+    def _stream_solutions(self):
+        """
+        Check if the worker processes send every solution to the parent process: only when all the solutions are
+        searched and passed to on_solution. Otherwise only the first solution is sent with the result.
+        """
+        return self._on_solution is not None and self._find_all
+
+    def _forward_solutions(self, solutions_queue, timeout):
+        """
+        Pass the solutions streamed by the worker processes to on_solution, waiting up to timeout seconds
+        (None: until there is one) for the first one
+        :return: number of solutions passed
+        """
+        solutions = _get_events(solutions_queue, timeout)
+        for solution in solutions:
+            self._on_solution(solution)
+        return len(solutions)
+
+    def _fill_portfolio(self, portfolio):
+        """
+        Search the same tree with several branching strategies in parallel, one process per strategy.
+        The result of the first strategy which finishes is kept and the other processes are stopped.
+        When all the solutions are passed to on_solution, they are streamed from the first strategy which finds one
+        and the result of this strategy is kept.
+        :return: True if the search was stopped
+        """
+        import multiprocessing
+        results = multiprocessing.Queue()
+        processes = []
+        for strategy_index, strategy in enumerate(portfolio):
+            options = self._get_worker_options()
+            options.update(strategy)
+            processes.append(multiprocessing.Process(target=_portfolio_worker,
+                                                     args=(self._get_container(), self._get_worker_pieces(), options,
+                                                           self._stream_solutions(), results, strategy_index)))
+        self._share_pieces()
+        for process in processes:
+            process.start()
+        # The strategy whose solutions are passed to on_solution, the first one which sent a solution
+        streamed_strategy = None
+        try:
+            while True:
+                message = _get_worker_message(results, processes)
+                if message[0] == "solution":
+                    _, strategy_index, solution = message
+                    if streamed_strategy is None:
+                        streamed_strategy = strategy_index
+                    if strategy_index == streamed_strategy:
+                        self._on_solution(solution)
+                    continue
+                _, self.portfolio_winner, self.no_solutions, self.solutions, self.place_attempt, counters = message
+                # All the solutions of a strategy are sent before its result
+                if streamed_strategy is None or self.portfolio_winner == streamed_strategy:
+                    break
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
+            _parent_shapes.clear()
+        self.logger.info("Strategy {} finished first".format(portfolio[self.portfolio_winner]))
+        self.metrics.merge(counters)
+        if self.no_solutions and self._on_solution and not self._find_all:
+            self._on_solution(self.solutions)
+        return self.no_solutions > 0 and not self._find_all
+
+    def _fill_work_stealing(self, workers):
+        """
+        Parallel search where the workers share their unexplored branches with the idle workers.
+        The workers report their progress and results through the results queue:
+        ("progress", place attempts, no of placed shapes), ("solution", solution) for every solution when they
+        are streamed, ("done", no_solutions, first solution, place attempts, metrics counters) at the end of
+        every subproblem, or ("error", exception) when the worker failed.
+        :return: True if the search was stopped
+        """
+        import multiprocessing
+        tasks = multiprocessing.Queue()
+        results = multiprocessing.Queue()
+        # Number of idle workers minus the number of subproblems waiting in the queue
+        waiting = multiprocessing.Value("i", -1)
+        # Number of subproblems ever published, incremented by a worker before it publishes one
+        no_subproblems = multiprocessing.Value("i", 1)
+        no_subproblems_done = 0
+        tasks.put((None, None, [], 0))
+
+        processes = [multiprocessing.Process(target=_work_stealing_worker,
+                                             args=(self._get_container(), self._get_worker_pieces(),
+                                                   self._get_worker_options(), self._stream_solutions(), tasks,
+                                                   results, waiting, no_subproblems))
+                     for _ in range(workers)]
+        self._share_pieces()
+        for process in processes:
+            process.start()
+        try:
+            while no_subproblems_done < no_subproblems.value:
+                message = _get_worker_message(results, processes)
+                if message[0] == "progress":
+                    _, place_attempt, self.no_placed_shapes = message
+                    if (self.place_attempt + place_attempt) // 100000 > self.place_attempt // 100000:
+                        self.logger.info("Attempt [{}]: No of placed shapes {}".format(self.place_attempt + place_attempt,
+                                                                                      self.no_placed_shapes))
+                    self.place_attempt += place_attempt
+                    self.metrics.update(self.place_attempt, self.no_placed_shapes)
+                elif message[0] == "solution":
+                    self._on_solution(message[1])
+                else:
+                    _, no_solutions, solutions, place_attempt, counters = message
+                    no_subproblems_done += 1
+                    self.place_attempt += place_attempt
+                    self.metrics.merge(counters)
+                    if no_solutions and not self.no_solutions:
+                        self.solutions = solutions
+                    self.no_solutions += no_solutions
+                    if no_solutions and not self._find_all:
+                        if self._on_solution:
+                            self._on_solution(self.solutions)
+                        return True
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
+            _parent_shapes.clear()
+
+        return False
+
+    def _share_work(self, depth, placed_shapes):
+        """
+        Publish the unexplored placements of the shallowest open node if there is an idle worker
+        and report the progress to the parent process
+        """
+        self._results.put(("progress", self.place_attempt - self._reported_place_attempt, self.no_placed_shapes))
+        self._reported_place_attempt = self.place_attempt
+
+        if self._waiting.value <= 0:
+            return
+        base, gapes, occupieds, indexes, ends, fills = self._stack
+        for frame_depth in range(depth + 1):
+            if indexes[frame_depth] < ends[frame_depth]:
+                with self._waiting.get_lock():
+                    if self._waiting.value <= 0:
+                        return
+                    self._waiting.value -= 1
+                # The parent must know about the new subproblem before it can be finished
+                with self._no_subproblems.get_lock():
+                    self._no_subproblems.value += 1
+                self._tasks.put((gapes[frame_depth], occupieds[frame_depth], placed_shapes[:base + frame_depth],
+                                 indexes[frame_depth]))
+                ends[frame_depth] = indexes[frame_depth]
+                # The subtrees of this node and its parents are no longer searched here
+                fills[:frame_depth + 1] = [-1] * (frame_depth + 1)
+                return
+
+    def _fill_checkpointed(self, checkpoint, checkpoint_interval, resume_from):
+        """
+        Bitboard search which saves its frontier to a checkpoint file
+        :return: True if the search was stopped
+        """
+        self._resume = []
+        if resume_from:
+            with open(resume_from) as checkpoint_file:
+                state = json.load(checkpoint_file)
+            if state["container"] != self._get_container() or state["shapes"] != self._get_worker_pieces() or \
+                    state["options"] != self._get_search_options():
+                raise ValueError("Checkpoint {} was saved for another search".format(resume_from))
+            self.no_solutions = state["no_solutions"]
+            self.solutions = state["solutions"]
+            self.place_attempt = state["place_attempt"]
+            if state["finished"]:
+                return self.no_solutions > 0
+            self._resume = state["frontier"]
+            self.logger.info("Resume search from attempt [{}] with {} placed shapes".format(self.place_attempt,
+                                                                                          len(self._resume) - 1))
+        if checkpoint:
+            state = {"container": self._get_container(), "shapes": self._get_worker_pieces(), "options": self._get_search_options()}
+            self._checkpoint = [checkpoint, checkpoint_interval, time.monotonic() + checkpoint_interval, state]
+
+        try:
+            stopped = self._fill_bitboard()
+            if checkpoint:
+                self._write_checkpoint(finished=True)
+        finally:
+            self._checkpoint = None
+            self._resume = []
+
+        return stopped
+
+    def _write_checkpoint(self, depth=0, finished=False):
+        """
+        Save the search frontier, the (gap, placement index) of every open node, and the counters.
+        The file is replaced atomically such that a killed process leaves a valid checkpoint.
+        """
+        checkpoint, checkpoint_interval, _, state = self._checkpoint
+        state["finished"] = finished
+        # The placement currently tried on every open node is the one before the next placement index
+        _, gapes, _, indexes, _, _ = self._stack
+        state["frontier"] = [] if finished else [[gapes[frame_depth], indexes[frame_depth] - 1]
+                                                 for frame_depth in range(depth + 1)]
+        state["no_solutions"] = self.no_solutions
+        state["solutions"] = self.solutions
+        # The placements currently tried on the open nodes are attempted again after resume
+        state["place_attempt"] = self.place_attempt - len(state["frontier"])
+        with open(checkpoint + ".tmp", "w") as checkpoint_file:
+            json.dump(state, checkpoint_file, separators=(",", ":"))
+        os.replace(checkpoint + ".tmp", checkpoint)
+        self._checkpoint[2] = time.monotonic() + checkpoint_interval
+
+    def _fill_dlx(self):
+        """
+        Solve the cube as an exact cover problem: the columns are the container locations and
+        the rows are the placements from the placement table.
+        For a collection of distinct shapes every shape has an additional column, so it is placed once.
+        :return: True if the search was stopped
+        """
+        size = self.size
+        columns = self._get_mask_indexes(((1 << self._no_locations) - 1) ^ self._blocked)
+        columns = dict(zip(columns, range(size)))
+        rows = []
+        rows_placed_shapes = []
+        for placements in self._placements:
+            for placement in placements:
+                row = [columns[index] for index in self._get_mask_indexes(placement[0])]
+                if self._orientation_pieces:
+                    row.append(size + self._orientation_pieces[placement[1]])
+                rows.append(row)
+                rows_placed_shapes.append(placement)
+
+        dlx = DancingLinks(size + (len(self._pieces) if self._orientation_pieces else 0), rows)
+        stopped = False
+        for solution_rows in dlx.iter_solutions():
+            if self._add_solution([rows_placed_shapes[row] for row in solution_rows]):
+                stopped = True
+                break
+        self.place_attempt += dlx.place_attempt
+
+        return stopped
+
+    def _fill_dp(self):
+        """
+        Dynamic programming over the layers of the longest axis, which are the blocks of layer_size consecutive
+        location bits. Before a layer is filled all the lower layers are full, so the state is the profile
+        (the occupied locations from the layer on, shifted down to bit 0) and the inventory. Filling the empty
+        locations of the layer with the placements of their lowest point gives the states of the next layer,
+        shifted down by layer_size. The number of fillings of a state is the sum over the states it is reached
+        from, and the first way a state is reached is kept to rebuild a solution.
+        :return: True if the search was stopped
+        """
+        layer_size = self._no_locations // self.dimensions[self._axes[2]]
+        states = {(self._blocked, self._inventory): 1}
+        # For every layer: state -> (previous state, placed shapes)
+        previous_states = []
+        for layer in range(self.dimensions[self._axes[2]]):
+            offset = layer * layer_size
+            layer_table = [[(mask >> offset, index) for mask, index in self._placements[offset + location]]
+                           for location in range(layer_size)]
+            next_states = {}
+            previous = {}
+            for state, no_fillings in states.items():
+                fillings = []
+                self._fill_layer(layer_table, layer_size, state[0], state[1], [], fillings)
+                for occupied, inventory, placed_shapes in fillings:
+                    next_state = (occupied >> layer_size, inventory)
+                    if next_state not in next_states:
+                        next_states[next_state] = 0
+                        previous[next_state] = (state, [(mask << offset, index) for mask, index in placed_shapes])
+                    next_states[next_state] += no_fillings
+            states = next_states
+            previous_states.append(previous)
+            self.metrics.update(self.place_attempt, self.no_placed_shapes)
+            self.logger.debug("Layer %s: %s profiles", layer, len(states))
+            if not states:
+                return False
+
+        # Walk back from the full container through the first way every state was reached
+        state = next(iter(states))
+        placed_shapes = []
+        for previous in reversed(previous_states):
+            state, layer_placed_shapes = previous[state]
+            placed_shapes.extend(layer_placed_shapes)
+        if not self._find_all:
+            return self._add_solution(placed_shapes)
+        self.no_solutions = sum(states.values())
+        self.solutions = self._get_shapes_locations(placed_shapes)
+        return False
+
+    def _fill_layer(self, layer_table, layer_size, occupied, inventory, placed_shapes, fillings):
+        """
+        Fill the empty locations among the lowest layer_size bits, always the lowest empty location first
+        :param fillings: list where (occupied, inventory, placed shapes) is appended for every filling
+        """
+        current_gape = (~occupied & (occupied + 1)).bit_length() - 1
+        if current_gape >= layer_size:
+            fillings.append((occupied, inventory, placed_shapes))
+            return
+        for placement in layer_table[current_gape]:
+            self.place_attempt += 1
+            if placement[0] & occupied:
+                continue
+            next_inventory = inventory
+            if self._inventory_fields is not None:
+                field_mask, unit = self._inventory_fields[placement[1]]
+                if not inventory & field_mask:
+                    continue
+                next_inventory -= unit
+            self._fill_layer(layer_table, layer_size, occupied | placement[0], next_inventory,
+                             placed_shapes + [placement], fillings)
+
+    @staticmethod
+    def _get_mask_indexes(mask):
+        """
+        Bit indexes set in a mask
+        """
+        indexes = []
+        while mask:
+            lowest_bit = mask & -mask
+            indexes.append(lowest_bit.bit_length() - 1)
+            mask ^= lowest_bit
+        return indexes
+
+    def _fill_cube(self):
+        """
+        Fill the cube with the shape points as lists of locations, trying every orientation shifted along x such
+        that it covers the current gap row. The search runs on an explicit stack with preallocated per-depth lists,
+        like _fill_bitboard, such that there is no depth limit.
+        :return: True if a solution was found
+        """
+        no_orientations = len(self._shape_orientations_points)
+        shape_size = len(self._shape_orientations_points[0])
+        max_depth = self.size // shape_size + 1
+        gapes = [None] * max_depth
+        orders = [None] * max_depth
+        positions = [0] * max_depth
+        shifts = [0] * max_depth
+        occupied_locations = []
+        shapes_locations = []
+
+        depth = 0
+        gapes[0] = [0, 0, 0]
+        orders[0] = range(no_orientations)
+        if self._value_order == self.VALUE_RANDOM:
+            orders[0] = self._random.sample(orders[0], no_orientations)
+        while depth >= 0:
+            order = orders[depth]
+            if positions[depth] == len(order):
+                # All the orientations were tried, remove the shape placed by the parent node
+                depth -= 1
+                if depth >= 0:
+                    del occupied_locations[-shape_size:]
+                    del shapes_locations[-1]
+                    self.no_placed_shapes -= 1
+                continue
+            index = order[positions[depth]]
+            current_gape = gapes[depth]
+            if not shifts[depth]:
+                self.place_attempt += 1
+                if self.place_attempt % 100000 == 0:
+                    self.logger.info("Attempt [{}]: No of placed shapes {}".format(self.place_attempt, self.no_placed_shapes))
+
+            # Get the positions that should be occupied by the shape in the next possible shift
+            shape_points_shifted = None
+            for shift_x in range(shifts[depth], self.length):
                 origin_offset_x = current_gape[0] - shift_x
                 if origin_offset_x < 0:
                     break
                 origin_offset = [origin_offset_x, current_gape[1], current_gape[2]]
-                # Get the positions that should be occupied by the shape
-                shape_points_shifted = Space.reset_origin(shape_points, offset=origin_offset)
-                shape_can_be_placed = True
+                points = Space.reset_origin(self._shape_orientations_points[index], offset=origin_offset)
                 # Check if it possible to place the shape in current position and orientation
-                for point in shape_points_shifted:
-                    if point in occupied_locations:
-                        shape_can_be_placed = False
-                        break
-                    if point[0] >= self.length or point[1] >= self.length or point[2] >= self.length:
-                        shape_can_be_placed = False
-                        break
+                if all(point not in occupied_locations and point[0] < self.length and point[1] < self.length and
+                       point[2] < self.length for point in points):
+                    shape_points_shifted = points
+                    shifts[depth] = shift_x + 1
+                    break
+            if shape_points_shifted is None:
+                # Try the next orientation
+                positions[depth] += 1
+                shifts[depth] = 0
+                continue
+
+            self.no_placed_shapes += 1
+            # Mark the positions as occupied and save shape position and orientation
+            occupied_locations.extend(shape_points_shifted)
+            rot_x, rot_y, rot_z = self._shape_orientations_rot[index]
+            shapes_locations.append([current_gape, rot_x, rot_y, rot_z])
+
+            self.logger.debug("Place shape at (x,y,z): %s", current_gape)
+            self.logger.debug("Rotation on X,Y,Z axis: %s %s %s", rot_x, rot_y, rot_z)
+
+            # Check if the cube is full
+            if len(occupied_locations) == self.size:
+                self.solutions = [list(shape_location) for shape_location in shapes_locations]
+                self.no_solutions += 1
+                return True
+
+            # Go to the next gape and place more shapes there
+            next_gape = current_gape
+            while next_gape in occupied_locations:
+                next_gape = self._get_next_location(next_gape)
+            depth += 1
+            gapes[depth] = next_gape
+            orders[depth] = range(no_orientations)
+            if self._value_order == self.VALUE_RANDOM:
+                orders[depth] = self._random.sample(orders[depth], no_orientations)
+            positions[depth] = 0
+            shifts[depth] = 0
+
+        return False
 
-                if shape_can_be_placed:
-                    self.no_placed_shapes += 1
-                    # Mark the positions as occupied and save shape position and orientation
-                    no_points_added = len(shape_points_shifted)
-                    occupied_locations = occupied_locations + shape_points_shifted
-                    rot_x, rot_y, rot_z = self._shape_orientations_rot[index]
-                    shapes_locations.append([current_gape, rot_x, rot_y, rot_z])
+    def _get_next_location(self, current_location):
+        """
+        Location after current_location in the cube, x first, then y and then z
+        """
+        [x, y, z] = current_location
+        index = x + (y + z * self.length) * self.length + 1
+        z, index = divmod(index, self.length * self.length)
+        y, x = divmod(index, self.length)
+        return [x, y, z]
 
-                    self.logger.debug("Place shape at (x,y,z): {}".format(current_gape))
-                    self.logger.debug("Rotation on X,Y,Z axis: {} {} {}".format(rot_x, rot_y, rot_z))
 
-                    # Check if the cube is full
-                    if len(occupied_locations) == self.size:
-                        self.solutions = shapes_locations
-                        self.no_solutions += 1
-                        return True
+def _get_shape_orientations(points):
+    """
+    Distinct orientations of a shape. Every orientation is normalized to the origin and sorted,
+    such that it can be deduplicated by hashing. The results are cached in the Shape.
+    :param points: sorted tuple with the (x, y, z) shape points normalized to the origin
+    :return: tuple of (orientation points, (rot_x, rot_y, rot_z))
+    """
+    orientations = []
+    orientations_seen = set()
+    rotations = Space.cube_rotations()
+    for shape_points, rotation in zip(Space.rotate_points_all(points, rotations, reset_origin=True), rotations):
+        shape_points = tuple(sorted(map(tuple, shape_points)))
+        if shape_points not in orientations_seen:
+            orientations_seen.add(shape_points)
+            orientations.append((shape_points, rotation))
+    return tuple(orientations)
 
-                    # Go to the next gape
-                    next_gape = current_gape
-                    while next_gape in occupied_locations:
-                        next_gape = self._get_next_location(next_gape)
-                    # Recurse to place more shapes
-                    solution_found = self._fill_cube(next_gape, occupied_locations, shapes_locations)
 
-                    if solution_found:
-                        return True
+_worker_cube = None
 
-                    # Remove the currently added shape and try another rotation
-                    for i in range(no_points_added):
-                        del occupied_locations[-1]
-                    del shapes_locations[-1]
-                    self.no_placed_shapes -= 1
+# Shapes of the search whose worker processes are running. The forked workers inherit them with their orientations
+# and placement tables, which are shared with the parent process until they are written to.
+_parent_shapes = {}
 
-        return solution_found
 
-    def _get_next_location(self, current_location):
+def _get_worker_shape(points):
+    """
+    Shape of a worker process, the one of the parent process if the worker was forked
+    """
+    shape = Shape(points)
+    return _parent_shapes.get(shape.key, shape)
+
+
+def _init_worker(container, pieces, options, solutions_queue=None):
+    """
+    Prepare the cube of a parallel search worker process, the placement table is built once per process.
+    The solutions are put on the solutions queue as soon as they are found, if there is one.
+    """
+    global _worker_cube
+    _worker_cube = MyCube(*container)
+    _worker_cube._set_search_options(options)
+    _worker_cube.metrics.counters = options["counters"]
+    _worker_cube._on_solution = solutions_queue.put if solutions_queue is not None else None
+    _worker_cube._prepare_search([[_get_worker_shape(points), count] for points, count in pieces])
+
+
+def _solve_subproblem(subproblem):
+    """
+    Search one subtree in a worker process
+    :param subproblem: (gap, occupied, placed shapes)
+    :return: (no_solutions, first solution, place_attempt, metrics counters)
+    """
+    current_gape, occupied, placed_shapes = subproblem
+    cube = _worker_cube
+    cube.no_solutions = 0
+    cube.solutions = []
+    cube.place_attempt = 0
+    cube.no_placed_shapes = len(placed_shapes)
+    cube.metrics.clear()
+    cube._fill_bitboard(current_gape, occupied, placed_shapes)
+    return cube.no_solutions, cube.solutions, cube.place_attempt, cube.metrics.get_counters()
+
+
+def _work_stealing_worker(container, pieces, options, stream_solutions, tasks, results, waiting, no_subproblems):
+    """
+    Work stealing worker process: search subproblems from the tasks queue until it gets None.
+    The solutions are sent as ("solution", solution) as soon as they are found if they are streamed,
+    an error is sent to the parent as ("error", exception).
+    """
+    try:
+        _init_worker(container, pieces, options)
+        cube = _worker_cube
+        if stream_solutions:
+            cube._on_solution = lambda solution: results.put(("solution", solution))
+        cube._tasks = tasks
+        cube._results = results
+        cube._waiting = waiting
+        cube._no_subproblems = no_subproblems
+        while True:
+            with waiting.get_lock():
+                waiting.value += 1
+            subproblem = tasks.get()
+            if subproblem is None:
+                break
+            current_gape, occupied, placed_shapes, first_index = subproblem
+            cube.no_solutions = 0
+            cube.solutions = []
+            cube.place_attempt = 0
+            cube._reported_place_attempt = 0
+            cube.metrics.clear()
+            cube._fill_bitboard(current_gape, occupied, placed_shapes, first_index)
+            results.put(("done", cube.no_solutions, cube.solutions, cube.place_attempt - cube._reported_place_attempt,
+                         cube.metrics.get_counters()))
+    except Exception as error:
+        results.put(("error", error))
+
+
+def _get_worker_message(results, processes):
+    """
+    Wait for the next message of the worker processes. Raise the error sent by a worker, or a RuntimeError when a
+    worker exited without sending its result, instead of waiting forever.
+    """
+    while True:
+        try:
+            message = results.get(timeout=0.1)
+        except queue.Empty:
+            for process in processes:
+                if not process.is_alive() and results.empty():
+                    raise RuntimeError("Search process exited with code {}".format(process.exitcode))
+            continue
+        if message[0] == "error":
+            raise message[1]
+        return message
+
+
+def _portfolio_worker(container, pieces, options, stream_solutions, results, strategy_index):
+    """
+    Portfolio worker process: search the whole tree with the strategy from the options.
+    The solutions are sent as ("solution", strategy index, solution) as soon as they are found if they are streamed,
+    the result as ("done", strategy index, no_solutions, first solution, place_attempt, metrics counters) and
+    an error as ("error", exception).
+    """
+    try:
+        _init_worker(container, pieces, options)
+        cube = _worker_cube
+        if stream_solutions:
+            cube._on_solution = lambda solution: results.put(("solution", strategy_index, solution))
+        cube._fill_bitboard()
+        results.put(("done", strategy_index, cube.no_solutions, cube.solutions, cube.place_attempt,
+                     cube.metrics.get_counters()))
+    except Exception as error:
+        results.put(("error", error))
+
+
+def _get_events(events, timeout, max_events=1000):
+    """
+    Wait up to timeout seconds for the next event of a solve_async worker and take the ones already queued
+    """
+    received = []
+    try:
+        received.append(events.get(timeout=timeout))
+        while len(received) < max_events:
+            received.append(events.get_nowait())
+    except queue.Empty:
+        pass
+    return received
 
-        index = current_location[0] +\
-                current_location[1] * self.length +\
-                current_location[2] * math.pow(self.length, 2)
-        index += 2
 
-        if index == 1:
-            return [1, 0, 0]
+def _async_worker(container, pieces, options, timeout, node_budget, progress_interval, events):
+    """
+    Worker process of solve_async: search with the time and node budgets and send the events to the parent
+    """
+    cube = MyCube(*container)
+    if timeout is not None:
+        timeout = time.monotonic() + timeout
+    cube._search_limits = [timeout, node_budget]
+    metrics = SearchMetrics(counters=True, on_progress=lambda snapshot: events.put(("progress", snapshot)),
+                            progress_interval=progress_interval)
+    shape = _get_worker_shape(pieces[0][0]) if pieces[0][1] is None else \
+        [(_get_worker_shape(points), count) for points, count in pieces]
+    status = "finished"
+    try:
+        cube.solve(shape, on_solution=lambda solution: events.put(("solution", solution)), metrics=metrics,
+                   **options)
+    except _SearchStopped as stopped:
+        status = stopped.args[0]
+        metrics.finish(cube.place_attempt, cube.no_placed_shapes, cube.no_solutions)
+    except Exception as error:
+        events.put(("error", error))
+        return
+    events.put(("done", dict(metrics.snapshot(), status=status, infeasible_reason=cube.infeasible_reason)))
+
+
+class _SearchStopped(Exception):
+    """
+    Raised to abort a search when the consumer of iter_solutions is gone or a budget of solve_async is spent
+    """
 
-        l2 = math.pow(self.length, 2)
 
-        tmp_z_inc = 1 if index % l2 else 0
-        z = index//l2 + tmp_z_inc
-        z = z - 1 if z else 0
-        tmp_y = index - z * l2
-        tmp_y_inc = 1 if tmp_y % self.length else 0
-        y = tmp_y//self.length + tmp_y_inc
-        y = y - 1 if y else 0
-        x = tmp_y - y * self.length
-        x = x - 1 if x else 0
+class SolutionWriter:
+    """
+    Solution sink which can be passed as on_solution: every solution is written to a file as soon as it is found,
+    so a full enumeration does not keep the solutions in memory. The file is flushed at least every flush_interval
+    seconds, such that the consumers can read the solutions while the search is running.
+    The JSON Lines format has one solution per line. The binary format has for every solution a header with
+    the number of shapes and the number of values per shape, followed by the values
+    x, y, z, rot_x / 90, rot_y / 90, rot_z / 90 (and the shape index) of every shape, all unsigned 16 bit integers.
+    """
+    [FORMAT_JSONL, FORMAT_BINARY] = ["jsonl", "binary"]
 
-        return [x, y, z]
+    def __init__(self, file_name, file_format=FORMAT_JSONL, flush_interval=1.0):
+        if file_format not in [self.FORMAT_JSONL, self.FORMAT_BINARY]:
+            raise ValueError("Unknown solution file format '{}'".format(file_format))
+        self.file_format = file_format
+        self.flush_interval = flush_interval
+        self.no_solutions = 0
+        self._file = open(file_name, "w" if file_format == self.FORMAT_JSONL else "wb")
+        self._next_flush = time.monotonic() + flush_interval
+
+    def __call__(self, solution):
+        if self.file_format == self.FORMAT_JSONL:
+            self._file.write(json.dumps(solution, separators=(",", ":")) + "\n")
+        else:
+            values = [value for shape_location in solution
+                      for value in shape_location[0] + [rotation // 90 for rotation in shape_location[1:4]] +
+                      shape_location[4:]]
+            self._file.write(struct.pack("<2H{}H".format(len(values)), len(solution),
+                                         len(values) // len(solution), *values))
+        self.no_solutions += 1
+        if time.monotonic() >= self._next_flush:
+            self._file.flush()
+            self._next_flush = time.monotonic() + self.flush_interval
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @classmethod
+    def read(cls, file_name, file_format=FORMAT_JSONL):
+        """
+        Generator which yields the solutions of a file written by a SolutionWriter
+        """
+        if file_format == cls.FORMAT_JSONL:
+            with open(file_name) as solutions_file:
+                for line in solutions_file:
+                    yield json.loads(line)
+            return
+        with open(file_name, "rb") as solutions_file:
+            while True:
+                header = solutions_file.read(4)
+                if len(header) < 4:
+                    return
+                no_shapes, no_values = struct.unpack("<2H", header)
+                values = struct.unpack("<{}H".format(no_shapes * no_values),
+                                       solutions_file.read(2 * no_shapes * no_values))
+                solution = []
+                for index in range(0, len(values), no_values):
+                    shape_values = list(values[index:index + no_values])
+                    solution.append([shape_values[:3]] + [value * 90 for value in shape_values[3:6]] +
+                                    shape_values[6:])
+                yield solution
+
+
+class SearchMetrics:
+    """
+    Instrumentation of the bitboard search. The search updates the counters in place: with counters, the nodes
+    (partial fillings which are searched further) per number of placed shapes and per gap location and the histogram
+    of the number of placements which fit on a node and, with timing, the time spent in the placement checks and
+    in the next gap search. The counters can be polled from another thread with snapshot(). on_progress is called by
+    the search with a snapshot every progress_interval seconds, e.g. to send it to another process.
+    The counters are updated on every node and timing measures every check with perf_counter, both slow the search
+    down. The parallel workers count if the counters are on, they do not time.
+    """
+
+    def __init__(self, timing=False, counters=False, on_progress=None, progress_interval=1.0):
+        self.timing = timing
+        self.counters = counters
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.reset([], 0, 0)
+
+    def reset(self, locations, max_depth, max_branching):
+        """
+        Clear the counters for a new search
+        :param locations: location [x, y, z] of every bit index
+        :param max_depth: maximum number of placed shapes
+        :param max_branching: maximum number of placements for a gap
+        """
+        self.locations = locations
+        self.place_attempt = 0
+        self.no_placed_shapes = 0
+        self.no_solutions = 0
+        self.nodes_per_depth = [0] * (max_depth + 1)
+        self.nodes_per_location = [0] * len(locations)
+        self.branching = [0] * (max_branching + 1)
+        # Seconds spent in the placement checks and in the next gap search
+        self.timings = [0.0, 0.0]
+        self.start_time = time.monotonic()
+        self.end_time = None
+        self._next_progress = self.start_time + self.progress_interval
+        self._timer_overhead = self._get_timer_overhead() if self.timing else 0.0
+
+    def clear(self):
+        """
+        Set the counters to zero, keeping the lists used by the search
+        """
+        for counters in self.get_counters():
+            counters[:] = [0] * len(counters)
+
+    def get_counters(self):
+        return [self.nodes_per_depth, self.nodes_per_location, self.branching]
+
+    def merge(self, counters):
+        """
+        Add the counters of a worker
+        """
+        for own_counters, other_counters in zip(self.get_counters(), counters):
+            # The table of another strategy can have more placements for a location
+            own_counters.extend([0] * (len(other_counters) - len(own_counters)))
+            for index, value in enumerate(other_counters):
+                own_counters[index] += value
+
+    def update(self, place_attempt, no_placed_shapes):
+        """
+        Called by the running search, calls on_progress when it is due
+        """
+        self.place_attempt = place_attempt
+        self.no_placed_shapes = no_placed_shapes
+        if self.on_progress is not None and time.monotonic() >= self._next_progress:
+            self._next_progress = time.monotonic() + self.progress_interval
+            self.on_progress(self.snapshot())
+
+    def finish(self, place_attempt, no_placed_shapes, no_solutions):
+        self.no_solutions = no_solutions
+        self.end_time = time.monotonic()
+        self._next_progress = self.end_time
+        self.update(place_attempt, no_placed_shapes)
+
+    def snapshot(self):
+        """
+        Current metrics as a dictionary
+        """
+        elapsed = (self.end_time or time.monotonic()) - self.start_time
+        nodes = sum(self.nodes_per_depth)
+        backtracks = sum(self.branching)
+        hot_locations = sorted(((nodes, index) for index, nodes in enumerate(self.nodes_per_location) if nodes),
+                               reverse=True)[:10]
+        return {"place_attempt": self.place_attempt,
+                "elapsed": elapsed,
+                "nodes_per_second": self.place_attempt / elapsed if elapsed else 0.0,
+                "nodes": nodes,
+                "no_placed_shapes": self.no_placed_shapes,
+                "deepest": max([depth for depth, nodes in enumerate(self.nodes_per_depth) if nodes] or [0]),
+                "no_solutions": self.no_solutions,
+                "nodes_per_depth": list(self.nodes_per_depth),
+                "branching": list(self.branching),
+                "backtracks": backtracks,
+                "backtrack_rate": self.branching[0] / backtracks if backtracks else 0.0,
+                "hot_locations": [[self.locations[index], nodes] for nodes, index in hot_locations],
+                "placement_check_time": max(0.0, self.timings[0] - self._timer_overhead * self.place_attempt),
+                "next_gap_time": max(0.0, self.timings[1] - self._timer_overhead * nodes)}
+
+    @staticmethod
+    def _get_timer_overhead(samples=10000):
+        """
+        Time measured by perf_counter for an empty block, subtracted from the timings
+        """
+        perf_counter = time.perf_counter
+        total = 0.0
+        for _ in range(samples):
+            tick = perf_counter()
+            total += perf_counter() - tick
+        return total / samples
+
+
+class DancingLinks:
+    """
+    Exact cover solver, Knuth's Algorithm X with dancing links.
+    The nodes are kept in flat lists: node 0 is the root, nodes 1..no_columns are the column headers
+    and the rest are the row nodes.
+    """
+    def __init__(self, no_columns, rows):
+        """
+        :param no_columns: number of columns (items to be covered exactly once)
+        :param rows: list with the column indexes covered by every row
+        """
+        no_headers = no_columns + 1
+        self.left = [index - 1 for index in range(no_headers)]
+        self.left[0] = no_columns
+        self.right = [index + 1 for index in range(no_headers)]
+        self.right[no_columns] = 0
+        self.up = list(range(no_headers))
+        self.down = list(range(no_headers))
+        self.column = list(range(no_headers))
+        self.row = [None] * no_headers
+        self.column_size = [0] * no_headers
+        self.place_attempt = 0
+
+        for row_index, columns in enumerate(rows):
+            first = None
+            for column in columns:
+                column += 1
+                node = len(self.column)
+                self.column.append(column)
+                self.row.append(row_index)
+                self.up.append(self.up[column])
+                self.down.append(column)
+                self.down[self.up[column]] = node
+                self.up[column] = node
+                self.column_size[column] += 1
+                if first is None:
+                    first = node
+                    self.left.append(node)
+                    self.right.append(node)
+                else:
+                    self.left.append(self.left[first])
+                    self.right.append(first)
+                    self.right[self.left[first]] = node
+                    self.left[first] = node
+
+    def _cover(self, column):
+        left, right, up, down = self.left, self.right, self.up, self.down
+        right[left[column]] = right[column]
+        left[right[column]] = left[column]
+        row_node = down[column]
+        while row_node != column:
+            node = right[row_node]
+            while node != row_node:
+                down[up[node]] = down[node]
+                up[down[node]] = up[node]
+                self.column_size[self.column[node]] -= 1
+                node = right[node]
+            row_node = down[row_node]
+
+    def _uncover(self, column):
+        left, right, up, down = self.left, self.right, self.up, self.down
+        row_node = up[column]
+        while row_node != column:
+            node = left[row_node]
+            while node != row_node:
+                self.column_size[self.column[node]] += 1
+                down[up[node]] = node
+                up[down[node]] = node
+                node = left[node]
+            row_node = up[row_node]
+        right[left[column]] = column
+        left[right[column]] = column
+
+    def iter_solutions(self):
+        """
+        Generate all exact covers, always branching on the column with the fewest rows left.
+        The search runs on an explicit stack with the selected row node of every level.
+        :return: generator with the list of selected row indexes for every solution
+        """
+        left, right, down = self.left, self.right, self.down
+        column_size = self.column_size
+        selected_nodes = [0] * len(column_size)
+        level = 0
+        column = row_node = 0
+        backtrack = False
+        while True:
+            if right[0] == 0:
+                yield [self.row[node] for node in selected_nodes[:level]]
+                backtrack = True
+            else:
+                # Choose the most constrained column
+                column = right[0]
+                best_size = column_size[column]
+                node = right[column]
+                while node != 0 and best_size:
+                    if column_size[node] < best_size:
+                        column = node
+                        best_size = column_size[node]
+                    node = right[node]
+                if best_size:
+                    self._cover(column)
+                    row_node = down[column]
+                else:
+                    backtrack = True
+
+            while True:
+                if backtrack:
+                    # Take back the row selected on the previous level and continue with its next row
+                    if level == 0:
+                        return
+                    level -= 1
+                    row_node = selected_nodes[level]
+                    node = left[row_node]
+                    while node != row_node:
+                        self._uncover(self.column[node])
+                        node = left[node]
+                    column = self.column[row_node]
+                    row_node = down[row_node]
+                    backtrack = False
+                if row_node != column:
+                    break
+                self._uncover(column)
+                backtrack = True
+
+            # Select the row and go to the next level
+            self.place_attempt += 1
+            selected_nodes[level] = row_node
+            node = right[row_node]
+            while node != row_node:
+                self._cover(self.column[node])
+                node = right[node]
+            level += 1
 
 
 class Shape:
     """
-    Abstract function to define a shape
+    Abstract function to define a shape.
+    The shape is immutable: the points are packed in a flat tuple of coordinates and the derived data
+    (bounds, orientations, placement tables) is computed once when it is first needed.
     """
-    def __init__(self, points=[]):
-        self.length_x = 0
-        self.length_y = 0
-        self.length_z = 0
-        self.points = points
+    __slots__ = ["_coordinates", "_min_max", "_key", "_orientations", "_placements"]
 
-        if points:
-            [min_x, max_x, min_y, max_y, min_z, max_z] = Space.min_max(points)
-            self.length_x = max_x - min_x + 1
-            self.length_y = max_y - min_y + 1
-            self.length_z = max_z - min_z + 1
+    # Number of containers for which the placement tables are kept, the least recently used one is dropped
+    MAX_PLACEMENT_TABLES = 8
 
-        self.no_points = len(self.points)
+    def __init__(self, points=None):
+        self._coordinates = tuple(coordinate for point in points or [] for coordinate in point)
+        self._min_max = None
+        self._key = None
+        self._orientations = None
+        self._placements = None
+
+    @property
+    def points(self):
+        coordinates = self._coordinates
+        return [list(coordinates[index:index + 3]) for index in range(0, len(coordinates), 3)]
+
+    @property
+    def no_points(self):
+        return len(self._coordinates) // 3
+
+    @property
+    def min_max(self):
+        """
+        [min_x, max_x, min_y, max_y, min_z, max_z] of the shape points
+        """
+        if self._min_max is None:
+            self._min_max = tuple(Space.min_max(self.points))
+        return self._min_max
+
+    @property
+    def length_x(self):
+        return self.min_max[1] - self.min_max[0] + 1 if self._coordinates else 0
+
+    @property
+    def length_y(self):
+        return self.min_max[3] - self.min_max[2] + 1 if self._coordinates else 0
+
+    @property
+    def length_z(self):
+        return self.min_max[5] - self.min_max[4] + 1 if self._coordinates else 0
+
+    @property
+    def key(self):
+        """
+        Sorted tuple of the points shifted to the origin, shapes which only differ by a translation have the same key
+        """
+        if self._key is None:
+            self._key = tuple(sorted(map(tuple, Space.reset_origin(self.points))))
+        return self._key
+
+    @property
+    def orientations(self):
+        """
+        The distinct orientations of the shape as (orientation points, (rot_x, rot_y, rot_z))
+        """
+        if self._orientations is None:
+            self._orientations = _get_shape_orientations(self.key)
+        return self._orientations
+
+    @property
+    def canonical_key(self):
+        """
+        Smallest key among the orientations of the shape, shapes which only differ by a rotation have the same one
+        """
+        return min(points for points, _ in self.orientations)
+
+    def get_placements(self, container):
+        """
+        Placement table cached for a container, None if it was not generated yet or dropped
+        """
+        if not self._placements or container not in self._placements:
+            return None
+        self._placements.move_to_end(container)
+        return self._placements[container]
+
+    def set_placements(self, container, placements):
+        """
+        Cache the placement table of a container, only the MAX_PLACEMENT_TABLES last used ones are kept
+        """
+        if self._placements is None:
+            self._placements = collections.OrderedDict()
+        self._placements[container] = placements
+        self._placements.move_to_end(container)
+        while len(self._placements) > self.MAX_PLACEMENT_TABLES:
+            self._placements.popitem(last=False)
+
+    def __eq__(self, other):
+        return isinstance(other, Shape) and self.key == other.key
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return "Shape({})".format(self.points)
 
     @classmethod
     def from_size(cls, length_x, length_y, length_z):
@@ -181,13 +2230,7 @@ class Shape:
         In case of parsing error it will raise an ValueError exception
 
         """
-        points = []
-        for x in range(length_x):
-            for y in range(length_y):
-                for z in range(length_z):
-                    points.append([x, y, z])
-
-        return cls(points)
+        return cls(itertools.product(range(length_x), range(length_y), range(length_z)))
 
     def get_occupied_position(self, origin, direction, rotation):
         """
@@ -234,6 +2277,80 @@ class Space:
     ROTATIONS = [ROT_0, ROT_90, ROT_180, ROT_270]
     DIRECTIONS = [DIR_Xp, DIR_Yp, DIR_Zp]
 
+    # All combinations of rotations around the X, Y and Z axis, 24 of them are distinct, see cube_rotations
+    AXES_ROTATIONS = list(itertools.product(ROTATIONS, repeat=3))
+
+    # Number of rotated points from which rotate_points_all uses numpy
+    NUMPY_MIN_POINTS = 1000
+
+    @staticmethod
+    def rotation_matrix(rot_x, rot_y, rot_z):
+        """
+        Integer matrix of the rotation around the X axis, then the Y axis and then the Z axis.
+        rotated point = matrix * point
+        """
+        columns = Space.rotate_points_x_axis([[1, 0, 0], [0, 1, 0], [0, 0, 1]], rot_x)
+        columns = Space.rotate_points_y_axis(columns, rot_y)
+        columns = Space.rotate_points_z_axis(columns, rot_z)
+        return [[columns[column][row] for column in range(3)] for row in range(3)]
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1)
+    def cube_rotations():
+        """
+        The 24 distinct rotations of the cube, for every rotation matrix the first (rot_x, rot_y, rot_z) of
+        AXES_ROTATIONS which gives it. Computed once.
+        """
+        rotations = collections.OrderedDict()
+        for rotation in Space.AXES_ROTATIONS:
+            rotations.setdefault(tuple(map(tuple, Space.rotation_matrix(*rotation))), rotation)
+        return tuple(rotations.values())
+
+    @staticmethod
+    @functools.lru_cache(maxsize=16)
+    def rotation_matrices(rotations):
+        """
+        (no of rotations, 3, 3) numpy array with the rotation_matrix of every rotation, built once for every tuple
+        of rotations. Needs numpy.
+        """
+        numpy_module = _get_numpy()
+        return numpy_module.array([Space.rotation_matrix(*rotation) for rotation in rotations],
+                                  dtype=numpy_module.int64)
+
+    @staticmethod
+    def rotate_array(points, rotations, reset_origin=False):
+        """
+        Apply many rotations at once to an (N, 3) integer array of points with a single batched matrix product.
+        Needs numpy.
+        :param rotations: list of (rot_x, rot_y, rot_z)
+        :return: (no of rotations, N, 3) array
+        """
+        _get_numpy()
+        matrices = Space.rotation_matrices(tuple(map(tuple, rotations)))
+        rotated = numpy.asarray(points, dtype=numpy.int64) @ matrices.transpose(0, 2, 1)
+        if reset_origin:
+            rotated -= rotated.min(axis=1, keepdims=True)
+        return rotated
+
+    @staticmethod
+    def rotate_points_all(points, rotations, reset_origin=False):
+        """
+        Apply many rotations to the same points, vectorized if numpy is available and there are at least
+        NUMPY_MIN_POINTS rotated points, fewer are faster without numpy and without importing it
+        :param rotations: list of (rot_x, rot_y, rot_z)
+        :return: list with the rotated points for every rotation
+        """
+        if len(points) and (_is_array(points) or len(points) * len(rotations) >= Space.NUMPY_MIN_POINTS) and \
+                _get_numpy() is not None:
+            return Space.rotate_array(points, rotations, reset_origin).tolist()
+        all_points = []
+        for rot_x, rot_y, rot_z in rotations:
+            new_points = Space.rotate_points_x_axis(points, rot_x)
+            new_points = Space.rotate_points_y_axis(new_points, rot_y)
+            new_points = Space.rotate_points_z_axis(new_points, rot_z, reset_origin)
+            all_points.append(new_points)
+        return all_points
+
     @staticmethod
     def rotate_points_axis(axis, points, rotation, reset_origin=False):
         if axis == Space.DIR_Xn:
@@ -269,6 +2386,8 @@ class Space:
         """
         X-Axis rotation
         """
+        if _is_array(points):
+            return Space.rotate_array(points, [(rotation, Space.ROT_0, Space.ROT_0)], reset_origin)[0]
         new_points = []
 
         for point in points:
@@ -283,6 +2402,8 @@ class Space:
         """
         Y-Axis rotation
         """
+        if _is_array(points):
+            return Space.rotate_array(points, [(Space.ROT_0, rotation, Space.ROT_0)], reset_origin)[0]
         new_points = []
 
         for point in points:
@@ -297,6 +2418,8 @@ class Space:
         """
         Y-Axis rotation
         """
+        if _is_array(points):
+            return Space.rotate_array(points, [(Space.ROT_0, Space.ROT_0, rotation)], reset_origin)[0]
         new_points = []
 
         for point in points:
@@ -352,6 +2475,10 @@ class Space:
         :param offset: shift all points with this offset
         :return: new points shifted
         """
+        if _is_array(points):
+            if not len(points):
+                return points.copy()
+            return points + offset if len(offset) else points - points.min(axis=0)
         if not points:
             return []
         else:
@@ -376,6 +2503,10 @@ class Space:
         :param points:
         :return: [min_x, max_x, min_y, max_y, min_z, max_z]
         """
+        if _is_array(points) and len(points):
+            [min_x, min_y, min_z] = points.min(axis=0).tolist()
+            [max_x, max_y, max_z] = points.max(axis=0).tolist()
+            return [min_x, max_x, min_y, max_y, min_z, max_z]
         min_x = None
         max_x = None
         min_y = None
@@ -408,6 +2539,7 @@ class Space:
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
 
     if 0:
         my_cube = MyCube(length=4)
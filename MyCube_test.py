@@ -1,7 +1,15 @@
 #!/usr/local/bin/python3
 
+import os
+import sys
+import asyncio
+import tempfile
+import subprocess
+import multiprocessing
 import unittest
+from unittest import mock
 from MyCube import *
+import batch
 
 
 MY_SHAPE_001 = [[0, 0, 0],
@@ -41,6 +49,15 @@ class MyCubeTestCase(unittest.TestCase):
         for index in range(6):
             my_loc = my_cube._get_next_location(my_loc)
         self.assertEqual(my_loc, [2, 2, 2])
+        self.assertTrue(all(isinstance(coordinate, int) for coordinate in my_loc))
+
+    def test_import(self):
+        # Importing the module has no side effects and does not import the slow optional modules
+        output = subprocess.check_output([sys.executable, "-c", "import sys, logging, MyCube; print(sorted("
+                                          "set(['numpy', 'asyncio', 'multiprocessing']) & set(sys.modules)), "
+                                          "logging.getLogger().handlers)"],
+                                         cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(output.decode().strip(), "[] []")
 
     def test_generate_shape_orientations(self):
         my_cube = MyCube(length=3)
@@ -50,18 +67,65 @@ class MyCubeTestCase(unittest.TestCase):
         self.assertEqual(len(my_cube._shape_orientations_points), 24, "There should be 24 possible orientations")
         self.assertEqual(len(my_cube._shape_orientations_rot), 24, "There should be 24 possible orientations")
 
+    def test_generate_shape_orientations_reused_cube(self):
+        my_cube = MyCube(length=3)
+        my_cube._generate_shape_orientations(Shape(MY_SHAPE_001))
+        my_cube._generate_shape_orientations(Shape(MY_SHAPE_001))
+        self.assertEqual(len(my_cube._shape_orientations_points), 24, "Orientations are not added again")
+        my_cube._generate_shape_orientations(Shape.from_size(1, 1, 2))
+        self.assertEqual(len(my_cube._shape_orientations_points), 3)
+
+    def test_generate_shape_orientations_large_shape(self):
+        my_cube = MyCube(length=10)
+        my_cube._generate_shape_orientations(Shape.from_size(2, 5, 10))
+        self.assertEqual(len(my_cube._shape_orientations_points), 6)
+        for shape_points in my_cube._shape_orientations_points:
+            self.assertEqual(len(shape_points), 100)
+            self.assertEqual(min(shape_points), [0, 0, 0])
+
     def test_generate_shape_orientations_symmetric_shape(self):
         my_cube = MyCube(length=2)
         my_cube._generate_shape_orientations(Shape.from_size(1, 1, 2))
         self.assertEqual(len(my_cube._shape_orientations_points), 3, "There should be 3 possible orientations")
         self.assertEqual(len(my_cube._shape_orientations_rot), 3, "There should be 3 possible orientations")
 
+    def test_generate_placements(self):
+        my_cube = MyCube(length=2)
+        my_cube._generate_shape_orientations(Shape.from_size(1, 1, 2))
+        my_cube._generate_shape_orientations_masks()
+        my_cube._generate_placements()
+
+        self.assertEqual(len(my_cube._placements), 8)
+        # From the origin the shape can go along every axis
+        self.assertEqual(sorted(mask for mask, _ in my_cube._placements[0]), [0b11, 0b101, 0b10001])
+        # The last location can not be the lowest point of any placement
+        self.assertEqual(my_cube._placements[7], [])
+        for location, placements in enumerate(my_cube._placements):
+            for mask, _ in placements:
+                self.assertEqual((mask & -mask).bit_length() - 1, location)
+
     def test_solve_shape_size_doesnt_fit(self):
         my_cube = MyCube(length=5)
         my_shape = Shape.from_size(1, 1, 2)
         number_solutions, _ = my_cube.solve(my_shape)
         self.assertEqual(number_solutions, 0, "No solutions can be found")
 
+    def test_solve_precheck(self):
+        my_cube = MyCube(length=6)
+        number_solutions, _ = my_cube.solve(Shape.from_size(1, 1, 4), engine=MyCube.ENGINE_BITBOARD)
+        self.assertEqual(number_solutions, 0, "No solutions can be found")
+        self.assertEqual(my_cube.place_attempt, 0, "No search was done")
+        self.assertTrue(my_cube.infeasible_reason.startswith("Colouring"))
+
+        my_cube = MyCube(length=2)
+        number_solutions, _ = my_cube.solve(Shape([[0, 0, 0], [1, 0, 0], [2, 0, 0], [0, 1, 0]]))
+        self.assertEqual(number_solutions, 0, "No solutions can be found")
+        self.assertEqual(my_cube.infeasible_reason, "Location [0, 0, 0] can not be covered by any shape")
+
+        my_cube = MyCube(length=2)
+        my_cube.solve(Shape.from_size(1, 1, 2), engine=MyCube.ENGINE_BITBOARD)
+        self.assertIsNone(my_cube.infeasible_reason)
+
     def test_solve_2by2_cube(self):
         my_cube = MyCube(length=2)
         my_shape = Shape.from_size(1, 1, 2)
@@ -85,6 +149,587 @@ class MyCubeTestCase(unittest.TestCase):
         print("Total attempts: {}".format(my_cube.place_attempt))
         self.assertEqual(number_solutions, 1, "Solution found")
 
+    def test_solve_unknown_engine(self):
+        my_cube = MyCube(length=2)
+        with self.assertRaises(ValueError):
+            my_cube.solve(Shape.from_size(1, 1, 2), engine="abacus")
+
+    def test_solve_2by2_cube_bitboard(self):
+        my_cube = MyCube(length=2)
+        my_shape = Shape.from_size(1, 1, 2)
+        number_solutions, solutions = my_cube.solve(my_shape, engine=MyCube.ENGINE_BITBOARD)
+        self.assertEqual(number_solutions, 1, "Solution found")
+        self.assertEqual(len(solutions), 4)
+
+    def test_solve_4by4_cube_bitboard(self):
+        my_cube = MyCube(length=4)
+        my_points = [
+            [0, 0, 0],
+            [1, 0, 0],
+            [2, 0, 0],
+            [0, 0, 1],
+            [1, 0, 1],
+            [2, 0, 1],
+            [0, 0, 2],
+            [0, 0, 3]
+        ]
+        my_shape = Shape(my_points)
+        number_solutions, solutions = my_cube.solve(my_shape, engine=MyCube.ENGINE_BITBOARD)
+        self.assertEqual(number_solutions, 1, "Solution found")
+        self.assertEqual(len(solutions), 8)
+
+    def test_solve_dlx_find_all(self):
+        my_cube = MyCube(length=2)
+        number_solutions, solutions = my_cube.solve(Shape.from_size(1, 1, 2), engine=MyCube.ENGINE_DLX, find_all=True)
+        self.assertEqual(number_solutions, 9, "There are 9 ways to fill a 2x2x2 cube with dominoes")
+        self.assertEqual(len(solutions), 4)
+        my_cube = MyCube(length=3)
+        number_solutions, _ = my_cube.solve(Shape.from_size(1, 1, 3), engine=MyCube.ENGINE_DLX, find_all=True)
+        self.assertEqual(number_solutions, 21, "There are 21 ways to fill a 3x3x3 cube with 1x1x3 rods")
+
+    def test_solve_deeper_than_recursion_limit(self):
+        # 1000 placed shapes, more than the default Python recursion limit
+        for engine in [MyCube.ENGINE_LIST, MyCube.ENGINE_BITBOARD, MyCube.ENGINE_DLX]:
+            my_cube = MyCube(length=10)
+            number_solutions, solutions = my_cube.solve(Shape([[0, 0, 0]]), engine=engine, precheck=False)
+            self.assertEqual(number_solutions, 1, "Solution found")
+            self.assertEqual(len(solutions), 1000)
+
+    def test_has_dead_region(self):
+        my_cube = MyCube(length=3)
+        my_cube._shape_size = 3
+        my_cube._generate_neighbour_masks()
+        self.assertFalse(my_cube._has_dead_region(0))
+        # The corner [0, 0, 0] is cut off from the other empty locations
+        walls = [[1, 0, 0], [0, 1, 0], [0, 0, 1]]
+        occupied = sum(1 << my_cube._get_index(location) for location in walls)
+        self.assertTrue(my_cube._has_dead_region(occupied))
+        # Consecutive bit indexes on different rows are not neighbours
+        my_cube._shape_size = 2
+        occupied = ((1 << 27) - 1) ^ (1 << my_cube._get_index([2, 0, 0])) ^ (1 << my_cube._get_index([0, 1, 0]))
+        self.assertTrue(my_cube._has_dead_region(occupied))
+        occupied = ((1 << 27) - 1) ^ (1 << my_cube._get_index([2, 0, 0])) ^ (1 << my_cube._get_index([2, 1, 0]))
+        self.assertFalse(my_cube._has_dead_region(occupied))
+        # A full layer leaves a region of 18 locations
+        my_cube._shape_size = 3
+        occupied = (1 << 9) - 1
+        self.assertFalse(my_cube._has_dead_region(occupied))
+
+    def test_solve_prune(self):
+        my_shape = Shape([[0, 0, 0], [1, 0, 0], [0, 1, 0]])
+        my_cube = MyCube(length=3)
+        number_solutions, _ = my_cube.solve(my_shape, engine=MyCube.ENGINE_BITBOARD, find_all=True)
+        place_attempt = my_cube.place_attempt
+        number_solutions_pruned, _ = my_cube.solve(my_shape, engine=MyCube.ENGINE_BITBOARD, find_all=True,
+                                                   prune_every=1)
+        self.assertEqual(number_solutions_pruned, number_solutions)
+        self.assertLess(my_cube.place_attempt, place_attempt)
+
+    def test_solve_dead_cache(self):
+        my_shape = Shape(MY_SHAPE_001)
+        my_cube = MyCube(length=5, width=3, height=4)
+        number_solutions, _ = my_cube.solve(my_shape, engine=MyCube.ENGINE_BITBOARD, find_all=True)
+        place_attempt = my_cube.place_attempt
+        for dead_cache in [1000000, 100]:
+            my_cube = MyCube(length=5, width=3, height=4)
+            self.assertEqual(my_cube.solve(my_shape, engine=MyCube.ENGINE_BITBOARD, find_all=True,
+                                           dead_cache=dead_cache)[0], number_solutions)
+            self.assertLess(my_cube.place_attempt, place_attempt)
+            self.assertGreater(my_cube.dead_cache_hits, 0)
+            self.assertGreater(my_cube.dead_cache_misses, 0)
+            self.assertLessEqual(len(my_cube._dead_states), dead_cache)
+        my_cube = MyCube(length=4)
+        number_solutions, _ = my_cube.solve(Shape.from_size(1, 2, 2), engine=MyCube.ENGINE_BITBOARD, find_all=True,
+                                            dead_cache=1000, workers=2, work_stealing=True)
+        self.assertEqual(number_solutions, 44913)
+
+    def test_solve_metrics(self):
+        snapshots = []
+        metrics = SearchMetrics(timing=True, counters=True, on_progress=snapshots.append, progress_interval=0)
+        my_cube = MyCube(length=4)
+        my_cube.CHECK_INTERVAL = 1000
+        my_cube.solve(Shape.from_size(1, 2, 2), engine=MyCube.ENGINE_BITBOARD, find_all=True, metrics=metrics)
+        self.assertIs(my_cube.metrics, metrics)
+        self.assertGreater(len(snapshots), 100)
+        snapshot = snapshots[-1]
+        self.assertEqual(snapshot, metrics.snapshot())
+        self.assertEqual(snapshot["place_attempt"], 220152)
+        self.assertEqual(snapshot["no_solutions"], 44913)
+        self.assertEqual(snapshot["deepest"], 15, "The 16th shape fills the cube")
+        self.assertEqual(sum(snapshot["nodes_per_depth"]), snapshot["nodes"])
+        self.assertEqual(snapshot["nodes_per_depth"][1], 3, "Three placements cover the first corner")
+        self.assertEqual(snapshot["backtracks"], snapshot["nodes"] + 1, "Every node and the root are left")
+        self.assertGreater(snapshot["backtrack_rate"], 0)
+        self.assertGreater(snapshot["placement_check_time"] + snapshot["next_gap_time"], 0)
+        self.assertEqual(len(snapshot["hot_locations"]), 10)
+
+        my_cube = MyCube(length=4)
+        my_cube.solve(Shape.from_size(1, 2, 2), engine=MyCube.ENGINE_BITBOARD, find_all=True, workers=2,
+                      metrics=SearchMetrics(counters=True))
+        self.assertEqual(my_cube.metrics.snapshot()["nodes"], snapshot["nodes"], "Counters of the workers merged")
+
+        # The nodes are only counted on demand
+        my_cube = MyCube(length=4)
+        my_cube.solve(Shape.from_size(1, 2, 2), engine=MyCube.ENGINE_BITBOARD, find_all=True)
+        self.assertEqual(my_cube.metrics.snapshot()["place_attempt"], 220152)
+        self.assertEqual(my_cube.metrics.snapshot()["nodes"], 0)
+
+    def test_solve_strategies(self):
+        my_shape = Shape(MY_SHAPE_001)
+        place_attempts = {}
+        for cell_order in MyCube.CELL_ORDERS:
+            for value_order in MyCube.VALUE_ORDERS:
+                my_cube = MyCube(length=5, width=3, height=4)
+                number_solutions, _ = my_cube.solve(my_shape, engine=MyCube.ENGINE_BITBOARD, find_all=True,
+                                                    cell_order=cell_order, value_order=value_order, seed=1)
+                self.assertEqual(number_solutions, 52)
+                place_attempts[cell_order] = my_cube.place_attempt
+        self.assertLess(place_attempts[MyCube.CELL_FEWEST], place_attempts[MyCube.CELL_LOWEST])
+
+        runs = []
+        for seed in [1, 1, 2]:
+            my_cube = MyCube(length=5, width=3, height=4)
+            _, solutions = my_cube.solve(my_shape, engine=MyCube.ENGINE_BITBOARD, value_order=MyCube.VALUE_RANDOM,
+                                         seed=seed)
+            runs.append([my_cube.place_attempt, solutions])
+        self.assertEqual(runs[0], runs[1], "Same seed, same search")
+        self.assertNotEqual(runs[0], runs[2])
+
+        my_cube = MyCube(length=4)
+        number_solutions, _ = my_cube.solve(Shape.from_size(1, 2, 2), engine=MyCube.ENGINE_BITBOARD, find_all=True,
+                                            cell_order=MyCube.CELL_FEWEST, value_order=MyCube.VALUE_RANDOM,
+                                            workers=2, work_stealing=True)
+        self.assertEqual(number_solutions, 44913)
+
+    def test_solve_portfolio(self):
+        portfolio = [{"cell_order": MyCube.CELL_LOWEST},
+                     {"cell_order": MyCube.CELL_CONSTRAINED, "value_order": MyCube.VALUE_RANDOM, "seed": 3}]
+        my_cube = MyCube(length=4)
+        number_solutions, _ = my_cube.solve(Shape.from_size(1, 2, 2), engine=MyCube.ENGINE_BITBOARD, find_all=True,
+                                            portfolio=portfolio)
+        self.assertEqual(number_solutions, 44913)
+        self.assertIn(my_cube.portfolio_winner, [0, 1])
+        found_solutions = []
+        my_cube = MyCube(length=3)
+        number_solutions, _ = my_cube.solve(Shape.from_size(1, 1, 3), engine=MyCube.ENGINE_BITBOARD, find_all=True,
+                                            on_solution=found_solutions.append, portfolio=portfolio)
+        self.assertEqual(number_solutions, 21)
+        self.assertEqual(len(found_solutions), 21)
+
+    def test_solve_portfolio_error(self):
+        # A failed strategy is reported instead of waiting forever for a result
+        my_cube = MyCube(length=2)
+        with self.assertRaises(TypeError):
+            my_cube.solve(Shape.from_size(1, 1, 2), engine=MyCube.ENGINE_BITBOARD, portfolio=[{"seed": [1]}])
+
+    def test_solve_strategies_not_supported(self):
+        my_cube = MyCube(length=2)
+        with self.assertRaises(ValueError):
+            my_cube.solve(Shape.from_size(1, 1, 2), engine=MyCube.ENGINE_BITBOARD, cell_order="largest")
+        with self.assertRaises(ValueError):
+            my_cube.solve(Shape.from_size(1, 1, 2), cell_order=MyCube.CELL_FEWEST)
+        with self.assertRaises(ValueError):
+            my_cube.solve(Shape.from_size(1, 1, 2), engine=MyCube.ENGINE_BITBOARD,
+                          portfolio=[{"value_order": "best"}])
+        # The strategies can not change the searched solutions
+        for strategy in [{"find_all": True}, {"unique": True}, {"prune_every": 1}]:
+            with self.assertRaises(ValueError):
+                my_cube.solve(Shape.from_size(1, 1, 2), engine=MyCube.ENGINE_BITBOARD, portfolio=[strategy])
+
+    def test_solve_symmetry_breaking(self):
+        for length, width, height, shape, unique, expected_solutions in [
+                [3, 3, 3, Shape.from_size(1, 1, 3), False, 21],
+                [3, 3, 3, Shape.from_size(1, 1, 3), True, 3],
+                [5, 3, 4, Shape(MY_SHAPE_001), False, 52],
+                [4, 4, 2, Shape([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 1, 1]]), False, 1302],
+                [4, 4, 2, Shape([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 1, 1]]), True, 185]]:
+            found_solutions = []
+            my_cube = MyCube(length, width, height)
+            number_solutions, solution = my_cube.solve(shape, engine=MyCube.ENGINE_BITBOARD, find_all=True,
+                                                       unique=unique, symmetry_breaking=True,
+                                                       on_solution=found_solutions.append)
+            self.assertEqual(number_solutions, expected_solutions)
+            self.assertEqual(len(set(str(sorted(found)) for found in found_solutions)), expected_solutions)
+            self.assertIn(solution, found_solutions)
+
+        place_attempts = []
+        for symmetry_breaking in [False, True]:
+            my_cube = MyCube(length=5, width=5, height=3)
+            number_solutions, _ = my_cube.solve(Shape(MY_SHAPE_001), engine=MyCube.ENGINE_BITBOARD, precheck=False,
+                                                symmetry_breaking=symmetry_breaking)
+            self.assertEqual(number_solutions, 0)
+            place_attempts.append(my_cube.place_attempt)
+        self.assertLess(place_attempts[1] * 8, place_attempts[0])
+        self.assertEqual(my_cube._get_location(my_cube._symmetry_cell), [2, 2, 1], "Center of the box")
+
+        with self.assertRaises(ValueError):
+            MyCube(length=2).solve(Shape.from_size(1, 1, 2), engine=MyCube.ENGINE_DLX, symmetry_breaking=True)
+
+    def test_generate_symmetries(self):
+        my_cube = MyCube(length=3)
+        symmetries = my_cube._generate_symmetries()
+        self.assertEqual(len(symmetries), 48, "There should be 48 cube symmetries")
+        for permutation in symmetries:
+            self.assertEqual(sorted(permutation), list(range(27)))
+            # The center of the cube never moves
+            self.assertEqual(permutation[13], 13)
+
+    def test_solve_find_all(self):
+        for engine in [MyCube.ENGINE_BITBOARD, MyCube.ENGINE_DLX]:
+            found_solutions = []
+            my_cube = MyCube(length=2)
+            number_solutions, solutions = my_cube.solve(Shape.from_size(1, 1, 2), engine=engine, find_all=True,
+                                                        on_solution=found_solutions.append)
+            self.assertEqual(number_solutions, 9)
+            self.assertEqual(len(found_solutions), 9)
+            self.assertEqual(solutions, found_solutions[0])
+            self.assertEqual(len(set(str(solution) for solution in found_solutions)), 9, "All solutions are different")
+
+    def test_solve_find_all_unique(self):
+        for engine in [MyCube.ENGINE_BITBOARD, MyCube.ENGINE_DLX]:
+            my_cube = MyCube(length=2)
+            number_solutions, _ = my_cube.solve(Shape.from_size(1, 1, 2), engine=engine, find_all=True, unique=True)
+            self.assertEqual(number_solutions, 2, "Dominoes all parallel or in two crossed layers")
+            my_cube = MyCube(length=3)
+            number_solutions, _ = my_cube.solve(Shape.from_size(1, 1, 3), engine=engine, find_all=True, unique=True)
+            self.assertEqual(number_solutions, 3)
+
+    def test_solve_find_all_unique_chiral(self):
+        # The mirror image of a solution with a chiral shape is not a solution, only the rotations are compared
+        for engine in [MyCube.ENGINE_BITBOARD, MyCube.ENGINE_DLX]:
+            my_cube = MyCube(length=2)
+            number_solutions, _ = my_cube.solve(Shape([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 1, 1]]), engine=engine,
+                                                find_all=True, unique=True)
+            self.assertEqual(number_solutions, 1)
+            self.assertEqual(len(my_cube._symmetries), 24)
+            my_cube = MyCube(length=2)
+            my_cube.solve(Shape.from_size(1, 1, 2), engine=engine, find_all=True, unique=True)
+            self.assertEqual(len(my_cube._symmetries), 48)
+
+    def test_solve_shapes(self):
+        my_shapes = {Shape.from_size(1, 2, 2): 1, Shape.from_size(1, 1, 2): 2}
+        found_solutions = []
+        my_cube = MyCube(length=2)
+        number_solutions, solutions = my_cube.solve(my_shapes, engine=MyCube.ENGINE_BITBOARD, find_all=True,
+                                                    on_solution=found_solutions.append)
+        self.assertEqual(number_solutions, 12, "6 plate positions, 2 ways to fill the rest with the dominoes")
+        self.assertEqual(sorted(shape_location[4] for shape_location in solutions), [0, 1, 1])
+        self.assertEqual(len(set(str(solution) for solution in found_solutions)), 12)
+        number_solutions, _ = my_cube.solve(my_shapes, engine=MyCube.ENGINE_BITBOARD, find_all=True, workers=2)
+        self.assertEqual(number_solutions, 12)
+        number_solutions, _ = my_cube.solve(my_shapes, engine=MyCube.ENGINE_BITBOARD, find_all=True, unique=True)
+        self.assertEqual(number_solutions, 1)
+
+        my_shapes = [Shape.from_size(1, 2, 2), Shape([[0, 0, 0], [1, 0, 0], [0, 1, 0]]), Shape.from_size(1, 1, 1)]
+        for engine in [MyCube.ENGINE_BITBOARD, MyCube.ENGINE_DLX]:
+            number_solutions, _ = MyCube(length=2).solve(my_shapes, engine=engine, find_all=True)
+            self.assertEqual(number_solutions, 6 * 4, "Plate, tromino in the other layer and the monocube")
+
+    def test_solve_shapes_not_supported(self):
+        my_shapes = {Shape.from_size(1, 2, 2): 1, Shape.from_size(1, 1, 2): 2}
+        my_cube = MyCube(length=2)
+        with self.assertRaises(ValueError):
+            my_cube.solve(my_shapes, engine=MyCube.ENGINE_DLX)
+        with self.assertRaises(ValueError):
+            my_cube.solve(my_shapes)
+        number_solutions, _ = my_cube.solve([Shape.from_size(1, 2, 2), Shape.from_size(1, 1, 2)],
+                                            engine=MyCube.ENGINE_BITBOARD)
+        self.assertEqual(number_solutions, 0)
+        self.assertIsNotNone(my_cube.infeasible_reason)
+
+    def test_solve_box(self):
+        for dimensions in [[3, 2, 1], [1, 3, 2]]:
+            for engine in [MyCube.ENGINE_BITBOARD, MyCube.ENGINE_DLX]:
+                my_cube = MyCube(*dimensions)
+                number_solutions, _ = my_cube.solve(Shape.from_size(1, 1, 2), engine=engine, find_all=True)
+                self.assertEqual(number_solutions, 3)
+                number_solutions, _ = my_cube.solve(Shape.from_size(1, 1, 2), engine=engine, find_all=True,
+                                                    unique=True)
+                self.assertEqual(number_solutions, 2)
+                self.assertEqual(len(my_cube._symmetries), 4, "Mirrorings of a box with different sides and one layer")
+        my_cube = MyCube(4, 3, 2)
+        self.assertEqual(my_cube._get_index([0, 0, 1]), 1, "Shortest axis first")
+        self.assertEqual(my_cube._get_location(my_cube._get_index([3, 2, 1])), [3, 2, 1])
+        with self.assertRaises(ValueError):
+            my_cube.solve(Shape.from_size(1, 1, 2))
+
+    def test_solve_dp(self):
+        for dimensions, shape in [[[2, 2, 8], Shape.from_size(1, 1, 2)], [[4, 4, 4], Shape.from_size(1, 2, 2)],
+                                  [[4, 3, 5], Shape(MY_SHAPE_001)],
+                                  [[2, 2, 4], [(Shape.from_size(1, 1, 2), 4), (Shape.from_size(1, 2, 2), 2)]]]:
+            found_solutions = []
+            expected_solutions, _ = MyCube(*dimensions).solve(shape, engine=MyCube.ENGINE_BITBOARD, find_all=True,
+                                                              on_solution=found_solutions.append)
+            number_solutions, solution = MyCube(*dimensions).solve(shape, engine=MyCube.ENGINE_DP, find_all=True)
+            self.assertEqual(number_solutions, expected_solutions)
+            self.assertIn(solution, found_solutions)
+            number_solutions, solution = MyCube(*dimensions).solve(shape, engine=MyCube.ENGINE_DP)
+            self.assertEqual(number_solutions, 1)
+            self.assertIn(solution, found_solutions)
+
+        my_cube = MyCube(2, 2, 40)
+        number_solutions, _ = my_cube.solve(Shape.from_size(1, 1, 2), engine=MyCube.ENGINE_DP, find_all=True)
+        self.assertEqual(number_solutions, 46956768150011031182641)
+        self.assertLess(my_cube.place_attempt, 2000, "Linear in the length of the box")
+        number_solutions, _ = MyCube(3, 3, 4).solve(Shape.from_size(1, 2, 2), engine=MyCube.ENGINE_DP, precheck=False)
+        self.assertEqual(number_solutions, 0)
+
+        with self.assertRaises(ValueError):
+            MyCube(length=2).solve(Shape.from_size(1, 1, 2), engine=MyCube.ENGINE_DP, find_all=True, unique=True)
+        with self.assertRaises(ValueError):
+            MyCube(length=2).solve(Shape.from_size(1, 1, 2), engine=MyCube.ENGINE_DP, find_all=True,
+                                   on_solution=print)
+
+    def test_solve_voxels(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            container = os.path.join(tmp_dir, "container.txt")
+            with open(container, "w") as container_file:
+                container_file.write("##\n#.\n\n##\n##\n")
+            my_cube = MyCube.from_file(container)
+        self.assertEqual(my_cube.dimensions, [2, 2, 2])
+        self.assertEqual(my_cube.size, 7)
+        my_shapes = [Shape.from_size(1, 2, 2), Shape([[0, 0, 0], [1, 0, 0], [0, 1, 0]])]
+        for engine in [MyCube.ENGINE_BITBOARD, MyCube.ENGINE_DLX]:
+            number_solutions, _ = my_cube.solve(my_shapes, engine=engine, find_all=True)
+            self.assertEqual(number_solutions, 3, "The plate on one of the 3 full sides")
+            number_solutions, _ = my_cube.solve(my_shapes, engine=engine, find_all=True, unique=True)
+            self.assertEqual(number_solutions, 1)
+        number_solutions, _ = my_cube.solve(my_shapes, engine=MyCube.ENGINE_BITBOARD, find_all=True, workers=2,
+                                            work_stealing=True)
+        self.assertEqual(number_solutions, 3)
+
+        # A repeated voxel is one location
+        my_cube = MyCube(voxels=[[0, 0, 0], [1, 0, 0], [1, 0, 0]])
+        self.assertEqual(my_cube.size, 2)
+        number_solutions, _ = my_cube.solve(Shape.from_size(1, 2, 1), engine=MyCube.ENGINE_BITBOARD)
+        self.assertEqual(number_solutions, 1)
+
+    def test_iter_solutions(self):
+        my_cube = MyCube(length=2)
+        solutions = list(my_cube.iter_solutions(Shape.from_size(1, 1, 2)))
+        self.assertEqual(len(solutions), 9)
+        self.assertEqual(len(set(str(solution) for solution in solutions)), 9, "All solutions are different")
+        my_cube = MyCube(length=4)
+        iter_solutions = my_cube.iter_solutions(Shape.from_size(1, 2, 2), buffer_size=1)
+        self.assertEqual(len(next(iter_solutions)), 16)
+        self.assertEqual(len(next(iter_solutions)), 16)
+        iter_solutions.close()
+        self.assertLess(my_cube.no_solutions, 44913, "Search stopped")
+        with self.assertRaises(ValueError):
+            next(MyCube(length=2).iter_solutions(Shape.from_size(1, 1, 2), engine=MyCube.ENGINE_LIST))
+
+    def test_solve_async(self):
+        async def collect(my_cube, shape, **options):
+            return [event async for event in my_cube.solve_async(shape, **options)]
+
+        loop = asyncio.new_event_loop()
+        try:
+            my_cube = MyCube(length=2)
+            events = loop.run_until_complete(collect(my_cube, Shape.from_size(1, 1, 2), find_all=True))
+            self.assertEqual([kind for kind, _ in events if kind == "solution"], ["solution"] * 9)
+            self.assertEqual(events[-1][0], "done")
+            self.assertEqual(events[-1][1]["status"], "finished")
+            self.assertEqual(events[-1][1]["no_solutions"], 9)
+            self.assertEqual(my_cube.no_solutions, 9)
+
+            my_cube = MyCube(length=5)
+            events = loop.run_until_complete(collect(my_cube, Shape(MY_SHAPE_001), node_budget=20000))
+            self.assertEqual(events[-1][1]["status"], "node_budget")
+            self.assertEqual(events[-1][1]["place_attempt"], 20000)
+            self.assertGreater(events[-1][1]["deepest"], 0)
+            self.assertEqual(my_cube.place_attempt, 20000)
+
+            events = loop.run_until_complete(collect(MyCube(length=5), Shape(MY_SHAPE_001), timeout=0.2))
+            self.assertEqual(events[-1][1]["status"], "timeout")
+
+            task = loop.create_task(collect(MyCube(length=5), Shape(MY_SHAPE_001)))
+            loop.run_until_complete(asyncio.sleep(0.2))
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                loop.run_until_complete(task)
+
+            with self.assertRaises(ValueError):
+                loop.run_until_complete(collect(MyCube(length=2), Shape.from_size(1, 1, 2), engine=MyCube.ENGINE_DLX))
+        finally:
+            loop.close()
+
+    def test_solution_writer(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for file_format in [SolutionWriter.FORMAT_JSONL, SolutionWriter.FORMAT_BINARY]:
+                solutions_file = os.path.join(tmp_dir, "solutions." + file_format)
+                found_solutions = []
+                with SolutionWriter(solutions_file, file_format) as writer:
+                    MyCube(length=2).solve({Shape.from_size(1, 2, 2): 1, Shape.from_size(1, 1, 2): 2},
+                                           engine=MyCube.ENGINE_BITBOARD, find_all=True,
+                                           on_solution=lambda solution: [writer(solution),
+                                                                         found_solutions.append(solution)])
+                self.assertEqual(writer.no_solutions, 12)
+                self.assertEqual(list(SolutionWriter.read(solutions_file, file_format)), found_solutions)
+
+    def test_solve_seed(self):
+        my_shape = Shape([[0, 0, 0], [1, 0, 0], [0, 1, 0]])
+        runs = []
+        for seed in [1, 1, 2]:
+            my_cube = MyCube(length=3)
+            _, solutions = my_cube.solve(my_shape, seed=seed)
+            runs.append([my_cube.place_attempt, solutions])
+        self.assertEqual(runs[0], runs[1], "Same seed, same search")
+        self.assertNotEqual(runs[0][0], runs[2][0])
+
+    def test_solve_list_solutions_not_shared(self):
+        my_cube = MyCube(length=2)
+        _, solutions = my_cube.solve(Shape.from_size(1, 2, 2))
+        _, other_solutions = my_cube.solve(Shape.from_size(1, 2, 2))
+        self.assertEqual(len(solutions), 2)
+        self.assertEqual(len(other_solutions), 2)
+        self.assertIsNot(solutions, other_solutions)
+
+    def test_solve_parallel(self):
+        found_solutions = []
+        my_cube = MyCube(length=3)
+        number_solutions, solutions = my_cube.solve(Shape.from_size(1, 1, 3), engine=MyCube.ENGINE_BITBOARD,
+                                                    find_all=True, on_solution=found_solutions.append, workers=2)
+        self.assertEqual(number_solutions, 21)
+        self.assertEqual(len(found_solutions), 21)
+        self.assertTrue(solutions in found_solutions)
+        number_solutions, _ = my_cube.solve(Shape.from_size(1, 1, 3), engine=MyCube.ENGINE_BITBOARD,
+                                            find_all=True, unique=True, workers=2)
+        self.assertEqual(number_solutions, 3)
+        self.assertEqual(sys.modules[MyCube.__module__]._parent_shapes, {}, "The shapes are released with the workers")
+
+    def test_solve_parallel_first_solution(self):
+        my_cube = MyCube(length=4)
+        my_shape = Shape.from_size(1, 2, 2)
+        number_solutions, solutions = my_cube.solve(my_shape, engine=MyCube.ENGINE_BITBOARD, workers=2, split_depth=2)
+        self.assertEqual(number_solutions, 1, "Solution found")
+        self.assertEqual(len(solutions), 16)
+
+    def test_solve_work_stealing(self):
+        my_cube = MyCube(length=4)
+        number_solutions, _ = my_cube.solve(Shape.from_size(1, 2, 2), engine=MyCube.ENGINE_BITBOARD, find_all=True,
+                                            workers=3, work_stealing=True)
+        self.assertEqual(number_solutions, 44913)
+        self.assertEqual(my_cube.place_attempt, 220152, "Same search tree as the serial search")
+        found_solutions = []
+        my_cube = MyCube(length=3)
+        number_solutions, _ = my_cube.solve(Shape.from_size(1, 1, 3), engine=MyCube.ENGINE_BITBOARD, find_all=True,
+                                            on_solution=found_solutions.append, workers=3, work_stealing=True)
+        self.assertEqual(number_solutions, 21)
+        self.assertEqual(len(found_solutions), 21)
+
+    def test_solve_work_stealing_first_solution(self):
+        my_cube = MyCube(length=4)
+        number_solutions, solutions = my_cube.solve(Shape.from_size(1, 2, 2), engine=MyCube.ENGINE_BITBOARD,
+                                                    workers=2, work_stealing=True)
+        self.assertEqual(number_solutions, 1, "Solution found")
+        self.assertEqual(len(solutions), 16)
+
+    def test_solve_parallel_streams_solutions(self):
+        # The workers send every solution as soon as it is found, before the result of their search
+        class Stopped(Exception):
+            pass
+
+        def stop(solution):
+            no_solutions_counted.append(my_cube.no_solutions)
+            raise Stopped()
+
+        for options in [{"workers": 2, "split_depth": 1}, {"workers": 2, "work_stealing": True},
+                        {"portfolio": [{"cell_order": MyCube.CELL_LOWEST}, {"cell_order": MyCube.CELL_FEWEST}]}]:
+            no_solutions_counted = []
+            my_cube = MyCube(length=4)
+            with self.assertRaises(Stopped):
+                my_cube.solve(Shape.from_size(1, 2, 2), engine=MyCube.ENGINE_BITBOARD, find_all=True, on_solution=stop,
+                              **options)
+            self.assertEqual(no_solutions_counted, [0])
+
+    def test_solve_work_stealing_error(self):
+        # A failed worker is reported instead of waiting forever for its subproblem
+        my_cube = MyCube(length=2)
+        with self.assertRaises(TypeError):
+            my_cube.solve(Shape.from_size(1, 1, 2), engine=MyCube.ENGINE_BITBOARD, workers=2, work_stealing=True,
+                          prune_every="x")
+        if multiprocessing.get_start_method() == "fork":
+            with mock.patch.object(MyCube, "_fill_bitboard", side_effect=lambda *args: os._exit(1)):
+                with self.assertRaises(RuntimeError):
+                    my_cube.solve(Shape.from_size(1, 1, 2), engine=MyCube.ENGINE_BITBOARD, workers=2,
+                                  work_stealing=True)
+
+    def test_solve_checkpoint_resume(self):
+        class Interrupted(Exception):
+            pass
+
+        def interrupt(solution):
+            found_solutions.append(solution)
+            if len(found_solutions) == 2000:
+                raise Interrupted()
+
+        found_solutions = []
+        my_shape = Shape.from_size(1, 2, 2)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            checkpoint = os.path.join(tmp_dir, "checkpoint.json")
+            my_cube = MyCube(length=4)
+            my_cube.CHECK_INTERVAL = 1000
+            with self.assertRaises(Interrupted):
+                my_cube.solve(my_shape, engine=MyCube.ENGINE_BITBOARD, find_all=True, on_solution=interrupt,
+                              checkpoint=checkpoint, checkpoint_interval=0)
+
+            my_cube = MyCube(length=4)
+            number_solutions, _ = my_cube.solve(my_shape, engine=MyCube.ENGINE_BITBOARD, find_all=True,
+                                                checkpoint=checkpoint, resume_from=checkpoint)
+            self.assertEqual(number_solutions, 44913)
+            self.assertEqual(my_cube.place_attempt, 220152, "Same search tree as without interruption")
+
+            # The search is already finished
+            my_cube = MyCube(length=4)
+            number_solutions, _ = my_cube.solve(my_shape, engine=MyCube.ENGINE_BITBOARD, find_all=True,
+                                                resume_from=checkpoint)
+            self.assertEqual(number_solutions, 44913)
+
+            with self.assertRaises(ValueError):
+                MyCube(length=4).solve(my_shape, engine=MyCube.ENGINE_BITBOARD, resume_from=checkpoint)
+
+    def test_solve_checkpoint_resume_random(self):
+        class Interrupted(Exception):
+            pass
+
+        def interrupt(solution):
+            found_solutions.append(solution)
+            if len(found_solutions) == 2000:
+                raise Interrupted()
+
+        found_solutions = []
+        my_shape = Shape.from_size(1, 2, 2)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            checkpoint = os.path.join(tmp_dir, "checkpoint.json")
+            my_cube = MyCube(length=4)
+            my_cube.CHECK_INTERVAL = 1000
+            with self.assertRaises(Interrupted):
+                my_cube.solve(my_shape, engine=MyCube.ENGINE_BITBOARD, find_all=True, on_solution=interrupt,
+                              value_order=MyCube.VALUE_RANDOM, checkpoint=checkpoint, checkpoint_interval=0)
+
+            # The random order without seed continues with the seed of the checkpoint
+            my_cube = MyCube(length=4)
+            number_solutions, _ = my_cube.solve(my_shape, engine=MyCube.ENGINE_BITBOARD, find_all=True,
+                                                value_order=MyCube.VALUE_RANDOM, resume_from=checkpoint)
+            self.assertEqual(number_solutions, 44913)
+
+    def test_solve_parallel_not_supported(self):
+        my_cube = MyCube(length=2)
+        with self.assertRaises(ValueError):
+            my_cube.solve(Shape.from_size(1, 1, 2), engine=MyCube.ENGINE_DLX, workers=2)
+
+    def test_solve_find_all_not_supported(self):
+        my_cube = MyCube(length=2)
+        with self.assertRaises(ValueError):
+            my_cube.solve(Shape.from_size(1, 1, 2), find_all=True)
+
+    def test_solve_5by5_cube_dlx(self):
+        my_cube = MyCube(length=5)
+        my_shape = Shape(MY_SHAPE_001)
+        number_solutions, solutions = my_cube.solve(my_shape, engine=MyCube.ENGINE_DLX)
+        self.assertEqual(number_solutions, 1, "Solution found")
+        self.assertEqual(len(solutions), 25)
+
     @unittest.skip("takes too much time!")
     def test_solve_5by5_cube(self):
         my_cube = MyCube(length=5)
@@ -93,6 +738,18 @@ class MyCubeTestCase(unittest.TestCase):
         self.assertEqual(number_solutions, 1, "Solution found")
 
 
+class DancingLinksTestCase(unittest.TestCase):
+    def test_exact_cover(self):
+        # Knuth's example, the only exact cover is made of the rows 0, 3 and 4
+        rows = [[2, 4, 5], [0, 3, 6], [1, 2, 5], [0, 3], [1, 6], [3, 4, 6]]
+        dlx = DancingLinks(7, rows)
+        self.assertEqual([sorted(solution) for solution in dlx.iter_solutions()], [[0, 3, 4]])
+
+    def test_no_exact_cover(self):
+        dlx = DancingLinks(3, [[0, 1], [1, 2]])
+        self.assertEqual(list(dlx.iter_solutions()), [])
+
+
 class MyPieceTestCase(unittest.TestCase):
     def test_class_exists(self):
         my_piece = MyPiece()
@@ -124,6 +781,54 @@ class ShapeTestCase(unittest.TestCase):
         self.assertEqual(my_shape.no_points, 8)
 
 
+    def test_immutable(self):
+        my_shape = Shape(MY_SHAPE_001)
+        my_shape.points.append([9, 9, 9])
+        self.assertEqual(my_shape.points, MY_SHAPE_001)
+        self.assertEqual(my_shape.no_points, 5)
+        with self.assertRaises(AttributeError):
+            my_shape.points = []
+        with self.assertRaises(AttributeError):
+            my_shape.color = "red"
+        self.assertEqual(Shape().points, [])
+
+    def test_hashable(self):
+        my_shape = Shape(MY_SHAPE_001)
+        my_shifted_shape = Shape([[x + 1, y + 2, z + 3] for [x, y, z] in reversed(MY_SHAPE_001)])
+        self.assertEqual(my_shape, my_shifted_shape)
+        self.assertEqual(hash(my_shape), hash(my_shifted_shape))
+        self.assertNotEqual(my_shape, Shape.from_size(1, 1, 5))
+        self.assertEqual(len({my_shape, my_shifted_shape, Shape.from_size(1, 1, 5)}), 2)
+
+    def test_canonical_key(self):
+        my_shape = Shape(MY_SHAPE_001)
+        my_rotated_shape = Shape(Space.rotate_points_all(MY_SHAPE_001, [[90, 180, 270]])[0])
+        self.assertNotEqual(my_shape, my_rotated_shape)
+        self.assertEqual(my_shape.canonical_key, my_rotated_shape.canonical_key)
+        self.assertIn(my_shape.canonical_key, [points for points, _ in my_shape.orientations])
+        mirrored_shape = Shape([[-x, y, z] for [x, y, z] in MY_SHAPE_001 + [[0, 1, 0]]])
+        self.assertNotEqual(Shape(MY_SHAPE_001 + [[0, 1, 0]]).canonical_key, mirrored_shape.canonical_key)
+
+    def test_placements_cached(self):
+        my_shape = Shape.from_size(1, 1, 2)
+        self.assertIsNone(my_shape.get_placements(2))
+        my_cube = MyCube(length=2)
+        my_cube.solve(my_shape, engine=MyCube.ENGINE_BITBOARD)
+        placements = my_shape.get_placements(2)
+        self.assertEqual(len(placements), 8)
+        MyCube(length=2).solve(my_shape, engine=MyCube.ENGINE_BITBOARD)
+        self.assertIs(my_shape.get_placements(2), placements)
+        self.assertEqual(len(my_shape.orientations), 3)
+        self.assertIs(my_shape.orientations, my_shape.orientations)
+        # Only the tables of the last used containers are kept
+        for length in range(3, Shape.MAX_PLACEMENT_TABLES + 2):
+            my_shape.set_placements(length, [])
+        self.assertIs(my_shape.get_placements(2), placements)
+        my_shape.set_placements(Shape.MAX_PLACEMENT_TABLES + 2, [])
+        self.assertIsNone(my_shape.get_placements(3))
+        self.assertIs(my_shape.get_placements(2), placements)
+
+
 class MathTestCase(unittest.TestCase):
     def test_trig_func(self):
         self.assertEqual(math.sin(math.pi/2), 1)
@@ -151,6 +856,59 @@ class SpaceTestCase(unittest.TestCase):
         self.assertEqual(Space.reset_origin(my_points), my_new_points)
         self.assertEqual(my_points, [[0, 0, 0], [-1, 0, 0]])
 
+    def test_rotation_matrix(self):
+        for rot_x, rot_y, rot_z in Space.AXES_ROTATIONS:
+            matrix = Space.rotation_matrix(rot_x, rot_y, rot_z)
+            for point in MY_SHAPE_001:
+                expected = Space.rotate_point_z_axis(Space.rotate_point_y_axis(Space.rotate_point_x_axis(
+                    point, rot_x), rot_y), rot_z)
+                self.assertEqual([sum(matrix[row][column] * point[column] for column in range(3)) for row in range(3)],
+                                 expected)
+
+    def test_cube_rotations(self):
+        rotations = Space.cube_rotations()
+        self.assertEqual(len(rotations), 24)
+        self.assertEqual(len(set(str(Space.rotation_matrix(*rotation)) for rotation in rotations)), 24)
+        self.assertEqual(rotations[0], (Space.ROT_0, Space.ROT_0, Space.ROT_0))
+
+    def test_rotate_points_all(self):
+        rotated = Space.rotate_points_all(MY_SHAPE_001, Space.AXES_ROTATIONS, reset_origin=True)
+        with mock.patch.object(sys.modules["MyCube"], "numpy", None):
+            rotated_without_numpy = Space.rotate_points_all(MY_SHAPE_001, Space.AXES_ROTATIONS, reset_origin=True)
+        self.assertEqual(len(rotated), 64)
+        self.assertEqual(rotated, rotated_without_numpy)
+        # Enough points to use numpy if it is installed
+        points = Shape.from_size(4, 4, 4).points
+        rotated = Space.rotate_points_all(points, Space.AXES_ROTATIONS, reset_origin=True)
+        with mock.patch.object(sys.modules["MyCube"], "numpy", None):
+            rotated_without_numpy = Space.rotate_points_all(points, Space.AXES_ROTATIONS, reset_origin=True)
+        self.assertEqual(rotated, rotated_without_numpy)
+
+    def test_shape_orientations_without_numpy(self):
+        # Enough points to use numpy if it is installed
+        points = tuple(sorted(map(tuple, Shape.from_size(3, 4, 5).points)))
+        orientations = sys.modules["MyCube"]._get_shape_orientations(points)
+        with mock.patch.object(sys.modules["MyCube"], "numpy", None):
+            orientations_without_numpy = sys.modules["MyCube"]._get_shape_orientations(points)
+        self.assertEqual(len(orientations), 6)
+        self.assertEqual(orientations, orientations_without_numpy)
+
+    @unittest.skipUnless(sys.modules["MyCube"]._get_numpy(), "numpy is not installed")
+    def test_array_points(self):
+        numpy = sys.modules["MyCube"].numpy
+        points = numpy.array(MY_SHAPE_001)
+        for rotation in Space.ROTATIONS:
+            self.assertEqual(Space.rotate_points_x_axis(points, rotation, reset_origin=True).tolist(),
+                             Space.rotate_points_x_axis(MY_SHAPE_001, rotation, reset_origin=True))
+            self.assertEqual(Space.rotate_points_y_axis(points, rotation).tolist(),
+                             Space.rotate_points_y_axis(MY_SHAPE_001, rotation))
+            self.assertEqual(Space.rotate_points_z_axis(points, rotation).tolist(),
+                             Space.rotate_points_z_axis(MY_SHAPE_001, rotation))
+        self.assertEqual(Space.min_max(points), Space.min_max(MY_SHAPE_001))
+        self.assertEqual(Space.reset_origin(points - 3).tolist(), MY_SHAPE_001)
+        self.assertEqual(Space.reset_origin(points, offset=[1, 2, 3]).tolist(),
+                         Space.reset_origin(MY_SHAPE_001, offset=[1, 2, 3]))
+
     def test_rotate_points_x_axis(self):
         my_exp_points = [[0, 0, 1],
                          [1, 0, 1],
@@ -171,5 +929,62 @@ class SpaceTestCase(unittest.TestCase):
             self.assertTrue(point in my_new_points)
 
 
+class BatchTestCase(unittest.TestCase):
+    DOMINO = [[0, 0, 0], [1, 0, 0]]
+
+    def test_get_canonical_job(self):
+        job = batch.get_canonical_job({"shape": [[0, 0, 1], [0, 0, 0]], "length": 2})
+        self.assertEqual(job["shapes"], [[[[0, 0, 0], [0, 0, 1]], None]])
+        self.assertEqual(job["container"], [2, 2, 2, None])
+        self.assertEqual(job["options"], {"engine": MyCube.ENGINE_BITBOARD, "cell_order": MyCube.CELL_FEWEST})
+        # Only the bitboard engine has branching strategies
+        job = batch.get_canonical_job({"shape": self.DOMINO, "length": 8, "width": 2, "height": 2, "engine": "dlx"})
+        self.assertEqual(job["container"], [2, 2, 8, None])
+        self.assertEqual(job["options"], {"engine": MyCube.ENGINE_DLX})
+        job = batch.get_canonical_job({"shapes": [[self.DOMINO, 1], [[[0, 0, 0], [0, 1, 0]], 2]],
+                                       "voxels": [[1, 1, 2], [2, 1, 2], [1, 2, 2]], "cell_order": "lowest"})
+        self.assertEqual(job["shapes"], [[[[0, 0, 0], [0, 0, 1]], 3]], "Rotated shapes are merged")
+        self.assertEqual(job["container"], [None, None, None, [[0, 0, 0], [0, 1, 0], [1, 0, 0]]])
+        self.assertEqual(job["options"]["cell_order"], MyCube.CELL_LOWEST)
+
+    def test_get_key(self):
+        def get_key(job):
+            return batch.get_key(batch.get_canonical_job(dict(job, shape=self.DOMINO)))
+
+        self.assertEqual(get_key({"length": 2}), get_key({"length": 2, "width": 2, "height": 2}))
+        self.assertEqual(get_key({"length": 2, "width": 2, "height": 8}), get_key({"length": 8, "width": 2,
+                                                                                  "height": 2}))
+        self.assertEqual(get_key({"voxels": [[0, 0, 0], [1, 0, 0]]}), get_key({"voxels": [[3, 2, 1], [2, 2, 1]]}))
+        self.assertEqual(get_key({"length": 2}), get_key({"length": 2, "engine": "dlx", "seed": 1}),
+                         "The engine does not change the result")
+        self.assertNotEqual(get_key({"length": 2}), get_key({"length": 2, "width": 3}))
+        self.assertNotEqual(get_key({"length": 2}), get_key({"length": 2, "find_all": True}))
+        self.assertNotEqual(get_key({"length": 2}), get_key({"length": 2, "unique": True}))
+
+    def test_run_batch(self):
+        jobs = [{"shape": self.DOMINO, "length": 2, "find_all": True},
+                {"shape": self.DOMINO, "length": 2, "width": 2, "height": 3, "engine": "dlx", "find_all": True},
+                {"shape": self.DOMINO, "length": 3, "width": 2, "height": 2, "engine": "dp", "find_all": True},
+                {"shapes": [[[[0, 0, 0], [1, 0, 0], [0, 1, 0]], 1], [[[0, 0, 0], [1, 0, 0], [1, 1, 0]], 1]],
+                 "length": 2, "width": 3, "height": 1},
+                {"shape": [[0, 0, 0], [1, 0, 0], [2, 0, 0]], "length": 2}]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = batch.ResultCache(os.path.join(tmp_dir, "cache.sqlite"))
+            try:
+                results = batch.run_batch(jobs, cache, workers=2)
+                self.assertEqual([result["status"] for result in results],
+                                 ["solvable", "solvable", "solvable", "solvable", "impossible"])
+                self.assertEqual([result["no_solutions"] for result in results], [9, 32, 32, 1, 0])
+                self.assertEqual(results[2]["container"], [2, 2, 3, None])
+                self.assertFalse(any(result["cached"] for result in results))
+                self.assertEqual(results[1]["container"], results[2]["container"])
+                # The first solution of the last job is answered by all the solutions of the first job
+                results = batch.run_batch(jobs + [{"shape": self.DOMINO, "length": 2}], cache, workers=1)
+                self.assertTrue(all(result["cached"] for result in results))
+                self.assertEqual(results[-1]["no_solutions"], 1)
+            finally:
+                cache.close()
+
+
 if __name__ == '__main__':
     unittest.main()
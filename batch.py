@@ -0,0 +1,220 @@
+"""
+Solve a manifest of jobs with a pool of processes and cache the results on disk.
+
+The manifest is a JSON Lines file with one job per line: the shape points (or a list of [shape points, count]
+for a collection of shapes), the container (length, width and height or voxels) and the solve options, e.g.
+
+    {"shape": [[0, 0, 0], [1, 0, 0], [2, 0, 0], [3, 0, 0], [1, 0, 1]], "length": 5}
+    {"shapes": [[[[0, 0, 0], [1, 0, 0]], 2], [[[0, 0, 0], [1, 0, 0], [0, 1, 0]], 1]], "voxels": [...]}
+    {"shape": [[0, 0, 0], [1, 0, 0]], "length": 4, "width": 2, "height": 3, "find_all": true}
+
+The shapes are replaced by their canonical orientation, the box dimensions are sorted and the voxels are moved to
+the origin, the solutions refer to the canonical shapes and container which are reported with the results.
+The worker processes build the shapes once, such that they keep their orientations and placement tables for all the
+jobs they solve. The results are saved in a sqlite database keyed by the canonical shapes, the container and the
+options which change the result, a rerun of the manifest only solves the new jobs:
+
+    python batch.py manifest.jsonl --cache results.sqlite --output results.jsonl
+"""
+import os
+import json
+import time
+import logging
+import sqlite3
+import hashlib
+import argparse
+import multiprocessing
+from MyCube import MyCube, Shape, Space
+
+
+# Solve options which can be given in a job, only find_all and unique change the result
+SOLVE_OPTIONS = ["engine", "find_all", "unique", "prune_every", "dead_cache", "cell_order", "value_order", "seed",
+                 "precheck", "symmetry_breaking"]
+
+DEFAULT_OPTIONS = {"engine": MyCube.ENGINE_BITBOARD}
+
+# Default options of the bitboard engine, the only one with branching strategies
+BITBOARD_OPTIONS = {"cell_order": MyCube.CELL_FEWEST}
+
+_worker_shapes = {}
+
+
+class ResultCache:
+    """
+    Results of the solved jobs in a sqlite database
+    """
+
+    def __init__(self, file_name):
+        self._connection = sqlite3.connect(file_name)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS results "
+                                 "(key TEXT PRIMARY KEY, job TEXT NOT NULL, result TEXT NOT NULL)")
+        self._connection.commit()
+
+    def get(self, key):
+        row = self._connection.execute("SELECT result FROM results WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, job, result):
+        self._connection.execute("INSERT OR REPLACE INTO results (key, job, result) VALUES (?, ?, ?)",
+                                 (key, json.dumps(job, sort_keys=True), json.dumps(result)))
+        self._connection.commit()
+
+    def close(self):
+        self._connection.close()
+
+
+def get_canonical_job(job):
+    """
+    Job with the canonical shapes as a list of [points, count], the count is None for a single shape without limit,
+    the container and the options.
+    The shapes which only differ by a rotation are merged in a collection.
+    """
+    if "shape" in job:
+        shapes = [[list(map(list, Shape(job["shape"]).canonical_key)), None]]
+    else:
+        counts = {}
+        for points, count in job["shapes"]:
+            canonical_key = Shape(points).canonical_key
+            counts[canonical_key] = counts.get(canonical_key, 0) + count
+        shapes = [[list(map(list, canonical_key)), counts[canonical_key]] for canonical_key in sorted(counts)]
+    options = dict(DEFAULT_OPTIONS)
+    options.update((name, job[name]) for name in SOLVE_OPTIONS if name in job)
+    if options["engine"] == MyCube.ENGINE_BITBOARD:
+        options = dict(BITBOARD_OPTIONS, **options)
+    return {"shapes": shapes, "container": get_canonical_container(job), "options": options}
+
+
+def get_canonical_container(job):
+    """
+    Container as [length, width, height, voxels]: the sorted dimensions of a box, a rotated box has the same
+    solutions, or the sorted voxels moved to the origin
+    """
+    if job.get("voxels") is not None:
+        return [None, None, None, sorted(Space.reset_origin([list(voxel) for voxel in job["voxels"]]))]
+    length = job.get("length") or 5
+    return sorted([length, job.get("width") or length, job.get("height") or length]) + [None]
+
+
+def get_key(canonical_job, find_all=None):
+    """
+    Cache key of a job: hash of the shapes, the container and the options which change the result
+    """
+    options = canonical_job["options"]
+    find_all = options.get("find_all", False) if find_all is None else find_all
+    key = [canonical_job["shapes"], canonical_job["container"], find_all, options.get("unique", False)]
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+
+def solve_job(canonical_job, shapes):
+    """
+    Solve one job with the already prepared shapes
+    :return: result dictionary
+    """
+    length, width, height, voxels = canonical_job["container"]
+    my_cube = MyCube(length, width, height, voxels)
+    start = time.perf_counter()
+    try:
+        no_solutions, solution = my_cube.solve(shapes, **canonical_job["options"])
+    except ValueError as error:
+        return {"status": "error", "error": str(error)}
+    return {"status": "solvable" if no_solutions else "impossible", "no_solutions": no_solutions,
+            "solution": solution, "infeasible_reason": my_cube.infeasible_reason,
+            "place_attempt": my_cube.place_attempt, "elapsed": time.perf_counter() - start}
+
+
+def get_shapes(shapes):
+    """
+    Shape, or list of (shape, count) for a collection, to solve the canonical shapes of a job
+    """
+    if shapes[0][1] is None:
+        return Shape(shapes[0][0])
+    return [(Shape(points), count) for points, count in shapes]
+
+
+def init_worker(shapes_list):
+    """
+    Build the shapes of all the jobs once per process, the Shape objects keep the orientations and placement tables
+    :param shapes_list: list with the canonical shapes of the jobs
+    """
+    global _worker_shapes
+    _worker_shapes = {json.dumps(shapes): get_shapes(shapes) for shapes in shapes_list}
+
+
+def solve_indexed_job(indexed_job):
+    """
+    Solve one job with the shapes built by init_worker
+    :param indexed_job: [job index, canonical job]
+    :return: [job index, result]
+    """
+    index, canonical_job = indexed_job
+    return [index, solve_job(canonical_job, _worker_shapes[json.dumps(canonical_job["shapes"])])]
+
+
+def run_batch(jobs, cache, workers):
+    """
+    Solve the jobs which are not in the cache
+    :return: list with the result of every job
+    """
+    canonical_jobs = [get_canonical_job(job) for job in jobs]
+    results = [None] * len(jobs)
+    pending = []
+    for index, canonical_job in enumerate(canonical_jobs):
+        result = cache.get(get_key(canonical_job))
+        if result is None and not canonical_job["options"].get("find_all"):
+            # All the solutions also answer if there is one
+            result = cache.get(get_key(canonical_job, find_all=True))
+            if result is not None:
+                result = dict(result, no_solutions=min(result["no_solutions"], 1))
+        if result is not None:
+            results[index] = dict(result, cached=True)
+        else:
+            pending.append([index, canonical_job])
+    shapes_list = [json.loads(shapes) for shapes in sorted(set(json.dumps(job["shapes"]) for _, job in pending))]
+    logging.info("{} of {} jobs cached, {} shapes to solve".format(len(jobs) - len(pending), len(jobs),
+                                                                   len(shapes_list)))
+
+    def save(index, result):
+        if result["status"] != "error":
+            cache.put(get_key(canonical_jobs[index]), canonical_jobs[index], result)
+        results[index] = dict(result, cached=False)
+
+    if workers > 1 and len(pending) > 1:
+        with multiprocessing.Pool(min(workers, len(pending)), init_worker, (shapes_list,)) as pool:
+            for index, result in pool.imap_unordered(solve_indexed_job, pending):
+                save(index, result)
+    else:
+        init_worker(shapes_list)
+        for indexed_job in pending:
+            save(*solve_indexed_job(indexed_job))
+
+    for canonical_job, result in zip(canonical_jobs, results):
+        result.update(shapes=canonical_job["shapes"], container=canonical_job["container"])
+    return results
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument("manifest", help="JSON Lines file with one job per line.")
+parser.add_argument("--cache", help="sqlite database with the results. Default batch_cache.sqlite.",
+                    default="batch_cache.sqlite")
+parser.add_argument("--output", help="JSON Lines file where the results are written in the manifest order. "
+                                     "Default the standard output.")
+parser.add_argument("--workers", help="Number of processes. Default the number of CPUs.", type=int,
+                    default=os.cpu_count())
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("MyCube").setLevel(logging.WARNING)
+    with open(args.manifest) as manifest_file:
+        manifest_jobs = [json.loads(line) for line in manifest_file if line.strip()]
+    result_cache = ResultCache(args.cache)
+    try:
+        batch_results = run_batch(manifest_jobs, result_cache, args.workers)
+    finally:
+        result_cache.close()
+    lines = "".join(json.dumps(result) + "\n" for result in batch_results)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(lines)
+    else:
+        print(lines, end="")
@@ -0,0 +1,149 @@
+"""
+Benchmark of the solver on a matrix of containers and shapes.
+
+Every case is searched --repeat times and the fastest run is reported with the number of place attempts
+(search nodes), the nodes per second and the wall time. The peak memory is measured in an additional run
+with tracemalloc. The results are written as JSON, with --baseline the throughput is compared to a previous
+results file and the exit code is 1 if a case is slower by more than the tolerance:
+
+    python bench.py --output baseline.json
+    python bench.py --baseline baseline.json --tolerance 0.2
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tracemalloc
+from MyCube import MyCube, Shape
+
+
+MY_SHAPE_001 = [[0, 0, 0],
+                [1, 0, 0],
+                [2, 0, 0],
+                [3, 0, 0],
+                [1, 0, 1]]
+
+T_TETROMINO = [[0, 0, 0],
+               [1, 0, 0],
+               [2, 0, 0],
+               [1, 1, 0]]
+
+# name, container [length, width, height], shape points, solve options
+CASES = [
+    ["pentacube-5-dlx", [5, 5, 5], MY_SHAPE_001, {"engine": MyCube.ENGINE_DLX}],
+    ["pentacube-5-fewest", [5, 5, 5], MY_SHAPE_001, {"engine": MyCube.ENGINE_BITBOARD,
+                                                      "cell_order": MyCube.CELL_FEWEST}],
+    ["pentacube-5x3x4-all", [5, 3, 4], MY_SHAPE_001, {"engine": MyCube.ENGINE_BITBOARD, "find_all": True}],
+    ["pentacube-5x3x4-all-fewest", [5, 3, 4], MY_SHAPE_001,
+     {"engine": MyCube.ENGINE_BITBOARD, "find_all": True, "cell_order": MyCube.CELL_FEWEST}],
+    ["pentacube-5x3x4-all-dead-cache", [5, 3, 4], MY_SHAPE_001,
+     {"engine": MyCube.ENGINE_BITBOARD, "find_all": True, "dead_cache": 100000}],
+    ["brick-1x2x2-4-all", [4, 4, 4], Shape.from_size(1, 2, 2).points,
+     {"engine": MyCube.ENGINE_BITBOARD, "find_all": True}],
+    ["brick-1x2x2-4-all-dlx", [4, 4, 4], Shape.from_size(1, 2, 2).points,
+     {"engine": MyCube.ENGINE_DLX, "find_all": True}],
+    ["brick-1x1x3-3-unique", [3, 3, 3], Shape.from_size(1, 1, 3).points,
+     {"engine": MyCube.ENGINE_BITBOARD, "find_all": True, "unique": True}],
+    ["brick-1x1x2-2x2x40-dp", [2, 2, 40], Shape.from_size(1, 1, 2).points,
+     {"engine": MyCube.ENGINE_DP, "find_all": True}],
+    ["brick-1x2x2-4-all-dp", [4, 4, 4], Shape.from_size(1, 2, 2).points,
+     {"engine": MyCube.ENGINE_DP, "find_all": True}],
+    ["tetromino-t-4-all", [4, 4, 4], T_TETROMINO, {"engine": MyCube.ENGINE_BITBOARD, "find_all": True}],
+    ["tetromino-t-4-list", [4, 4, 4], T_TETROMINO, {"engine": MyCube.ENGINE_LIST}],
+    ["impossible-pentacube-5x5x3", [5, 5, 3], MY_SHAPE_001, {"engine": MyCube.ENGINE_BITBOARD, "precheck": False}],
+    ["impossible-pentacube-5x5x3-prune", [5, 5, 3], MY_SHAPE_001,
+     {"engine": MyCube.ENGINE_BITBOARD, "precheck": False, "prune_every": 1}],
+    ["impossible-brick-1x2x2-3x3x4-precheck", [3, 3, 4], Shape.from_size(1, 2, 2).points,
+     {"engine": MyCube.ENGINE_BITBOARD}],
+    ["impossible-brick-1x1x2-5", [5, 5, 5], Shape.from_size(1, 1, 2).points, {"engine": MyCube.ENGINE_BITBOARD}],
+]
+
+# The throughput of cases faster than this (seconds) is too noisy to be compared with the baseline
+MIN_WALL_TIME = 0.05
+
+
+def run_case(container, shape_points, options, seed):
+    """
+    Search one case with a new cube and shape, such that no cached placement table is reused
+    :return: [no_solutions, place_attempt, wall time]
+    """
+    my_cube = MyCube(*container)
+    start = time.perf_counter()
+    no_solutions, _ = my_cube.solve(Shape(shape_points), seed=seed, **options)
+    return [no_solutions, my_cube.place_attempt, time.perf_counter() - start]
+
+
+def run_benchmark(cases, seed, repeat):
+    results = []
+    for name, container, shape_points, options in cases:
+        runs = [run_case(container, shape_points, options, seed) for _ in range(repeat)]
+        no_solutions, place_attempt, wall_time = min(runs, key=lambda run: run[2])
+
+        tracemalloc.start()
+        run_case(container, shape_points, options, seed)
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results.append({"name": name, "container": container, "options": options, "no_solutions": no_solutions,
+                        "place_attempt": place_attempt, "wall_time": wall_time,
+                        "nodes_per_second": place_attempt / wall_time if wall_time else 0.0,
+                        "peak_memory": peak_memory})
+        print("{:<40} {:>8} solutions {:>10} nodes {:>12.0f} nodes/s {:>8.3f} s {:>8.1f} MiB".format(
+            name, no_solutions, place_attempt, results[-1]["nodes_per_second"], wall_time, peak_memory / 2 ** 20))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare the results with the baseline results
+    :return: list of the regressions found
+    """
+    regressions = []
+    baseline_cases = {case["name"]: case for case in baseline["cases"]}
+    for case in results:
+        baseline_case = baseline_cases.get(case["name"])
+        if baseline_case is None:
+            continue
+        if case["no_solutions"] != baseline_case["no_solutions"]:
+            regressions.append("{}: {} solutions instead of {}".format(case["name"], case["no_solutions"],
+                                                                      baseline_case["no_solutions"]))
+        if case["place_attempt"] != baseline_case["place_attempt"]:
+            print("{}: search tree changed, {} nodes instead of {}".format(case["name"], case["place_attempt"],
+                                                                          baseline_case["place_attempt"]))
+        if baseline_case["wall_time"] < MIN_WALL_TIME:
+            continue
+        if case["wall_time"] > baseline_case["wall_time"] * (1 + tolerance) and \
+                case["nodes_per_second"] < baseline_case["nodes_per_second"] * (1 - tolerance):
+            regressions.append("{}: {:.0f} nodes/s, baseline {:.0f} nodes/s".format(
+                case["name"], case["nodes_per_second"], baseline_case["nodes_per_second"]))
+    return regressions
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--seed", help="Seed of the random orientation order of the list engine. Default 0.",
+                    type=int, default=0)
+parser.add_argument("--repeat", help="Number of runs of every case, the fastest one is reported. Default 3.",
+                    type=int, default=3)
+parser.add_argument("--cases", help="Only run the cases whose name contains one of these strings.", nargs="*")
+parser.add_argument("--output", help="JSON file where the results are written.")
+parser.add_argument("--baseline", help="JSON results file to compare the throughput with.")
+parser.add_argument("--tolerance", help="Allowed relative throughput loss compared to the baseline. Default 0.2.",
+                    type=float, default=0.2)
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    selected_cases = [case for case in CASES if not args.cases or any(text in case[0] for text in args.cases)]
+    benchmark = {"seed": args.seed, "repeat": args.repeat, "python": platform.python_version(),
+                 "platform": platform.platform(), "cases": run_benchmark(selected_cases, args.seed, args.repeat)}
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(benchmark, output_file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            found_regressions = compare(benchmark["cases"], json.load(baseline_file), args.tolerance)
+        for regression in found_regressions:
+            print("Regression {}".format(regression))
+        sys.exit(1 if found_regressions else 0)
@@ -1,13 +1,43 @@
-import subprocess
+import logging
 import argparse
+from MyCube import MyCube, Shape, SolutionWriter
 
 
+MY_SHAPE = [[0, 0, 0],
+            [1, 0, 0],
+            [2, 0, 0],
+            [3, 0, 0],
+            [1, 0, 1]]
+
 parser = argparse.ArgumentParser()
 parser.add_argument("no_processes", help="Number of separate processes to execute in parallel. Default 10.",
-                    type=int, default=10)
+                    type=int, nargs="?", default=10)
+parser.add_argument("--length", help="Cube length. Default 5.", type=int, default=5)
+parser.add_argument("--width", help="Box width. Default the length.", type=int)
+parser.add_argument("--height", help="Box height. Default the length.", type=int)
+parser.add_argument("--container", help="Text file with the voxels of the container instead of a box.")
+parser.add_argument("--split-depth", help="Number of placed shapes after which the search tree is split. Default 3.",
+                    type=int, default=3)
+parser.add_argument("--output", help="Find all solutions and write them as JSON Lines to this file.")
 args = parser.parse_args()
 
-for i in range(args.no_processes):
-    file_name = "execution_" + str(i) + ".txt"
-    with open(file_name, "wb") as out:
-        subprocess.Popen("python3 MyCube.py", stdout=out, stderr=None)
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if args.container:
+        my_cube = MyCube.from_file(args.container)
+    else:
+        my_cube = MyCube(length=args.length, width=args.width, height=args.height)
+    if args.output:
+        with SolutionWriter(args.output) as writer:
+            number_solutions, _ = my_cube.solve(Shape(MY_SHAPE), engine=MyCube.ENGINE_BITBOARD, find_all=True,
+                                                on_solution=writer, workers=args.no_processes,
+                                                split_depth=args.split_depth)
+        print("{} solutions written to {}".format(number_solutions, args.output))
+    else:
+        number_solutions, solutions = my_cube.solve(Shape(MY_SHAPE), engine=MyCube.ENGINE_BITBOARD,
+                                                    workers=args.no_processes, split_depth=args.split_depth)
+        if number_solutions:
+            for index, solution in enumerate(solutions, 1):
+                print("[{}] Position (x,y,z): {} Rotation X,Y,Z axis: {} {} {}".format(index, *solution))
+        else:
+            print("Cube could not be solved!")